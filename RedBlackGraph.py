@@ -1,5 +1,122 @@
-import networkx as nx
-import matplotlib.pyplot as plt
+import collections
+import functools
+import gzip
+import hashlib
+import os
+import struct
+import time
+
+# NumPy is only imported to load large or packed matrices, so that short jobs start fast
+
+# Packed binary matrix files start with this header
+PACKED_MAGIC = b'RBGRAPH1'
+GZIP_MAGIC = b'\x1f\x8b'
+# Text matrices up to this size are parsed without NumPy
+SMALL_MATRIX_BYTES = 1 << 20
+# Bytes read at a time when streaming a text matrix
+READ_CHUNK_SIZE = 1 << 24
+# Byte value lookup for text matrices: 0 and 1 for digits, WHITESPACE_BYTE for separators, INVALID_BYTE otherwise
+WHITESPACE_BYTE, INVALID_BYTE = 2, 3
+
+# Graph snapshot files start with this magic and a header of counts (see snapshot_sections)
+SNAPSHOT_MAGIC = b'RBSNAP01'
+SNAPSHOT_HEADER = struct.Struct('<IIiI')
+# Character set codes in snapshots; characters out of the partition are stored as NO_SET
+CHARACTER_SETS = ('intersection', 'universal', 'contained', 'active')
+NO_SET = 255
+
+@functools.lru_cache(maxsize=None)
+def byte_values():
+    import numpy as np
+    values = np.full(256, INVALID_BYTE, dtype=np.uint8)
+    values[list(b' \t\r\n')] = WHITESPACE_BYTE
+    values[list(b'01')] = [0, 1]
+    return values
+
+def iter_bits(mask):
+    """
+    Yield the positions of the set bits of mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+# Species read at a time when transposing a packed matrix (a multiple of 8)
+TRANSPOSE_BLOCK_SPECIES = 1 << 13
+
+def read_packed_rows(file_path):
+    """
+    Memory-map a packed binary matrix file and return its (character bit-rows, species bit-rows),
+    as read by RedBlackGraph.from_rows. The species rows are the packed rows themselves; only the
+    transpose is unpacked, a block of species at a time.
+    """
+    import numpy as np
+    num_species, num_characters = (int(count) for count in np.fromfile(file_path, dtype='<u4', count=2, offset=len(PACKED_MAGIC)))
+    packed = np.memmap(file_path, dtype=np.uint8, mode='r', offset=len(PACKED_MAGIC) + 8,
+                       shape=(num_species, (num_characters + 7) // 8))
+    species_rows = [int.from_bytes(row, 'little') for row in packed]
+
+    transposed = np.zeros((num_characters, (num_species + 7) // 8), dtype=np.uint8)
+    for start in range(0, num_species, TRANSPOSE_BLOCK_SPECIES):
+        block = np.unpackbits(packed[start:start + TRANSPOSE_BLOCK_SPECIES], axis=1, count=num_characters, bitorder='little')
+        columns = np.packbits(block.T, axis=1, bitorder='little')
+        transposed[:, start // 8:start // 8 + columns.shape[1]] = columns
+    character_rows = [int.from_bytes(row, 'little') for row in transposed]
+    return character_rows, species_rows
+
+def snapshot_sections(num_characters, num_species, names_bytes):
+    """
+    Return the (offset, size) of every section of a snapshot file, each aligned to 8 bytes:
+    node names (UTF-8, characters then species, one per line), character set codes (uint8),
+    red species flags (uint8), character counters [red, black] and species counters
+    [active, inactive] (little-endian int32 pairs), then the edge and red edge bit-rows of
+    every character over species ids, (num_species + 7) // 8 bytes each.
+    """
+    row_bytes = (num_species + 7) // 8
+    sizes = [('names', names_bytes), ('character_sets', num_characters), ('species_red', num_species),
+             ('character_counters', 8 * num_characters), ('species_counters', 8 * num_species),
+             ('character_rows', num_characters * row_bytes), ('red_rows', num_characters * row_bytes)]
+    sections = {}
+    offset = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size
+    for name, size in sizes:
+        sections[name] = (offset, size)
+        offset += (size + 7) // 8 * 8
+    return sections
+
+def read_snapshot_arrays(file_path):
+    """
+    Memory-map a snapshot file for offline analysis. Return a dict with the node names, the
+    partition red species count (None if never computed) and NumPy views of the other sections;
+    the bit-rows are unpacked to character x species boolean arrays.
+    """
+    import numpy as np
+    with open(file_path, 'rb') as file:
+        if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a graph snapshot: {file_path}")
+        num_characters, num_species, partition_red, names_bytes = SNAPSHOT_HEADER.unpack(file.read(SNAPSHOT_HEADER.size))
+        names = file.read(names_bytes).decode('utf-8').split('\n') if names_bytes else []
+    sections = snapshot_sections(num_characters, num_species, names_bytes)
+    data = np.memmap(file_path, dtype=np.uint8, mode='r')
+
+    def section(name, dtype, shape):
+        offset, size = sections[name]
+        return data[offset:offset + size].view(dtype).reshape(shape)
+
+    row_bytes = (num_species + 7) // 8
+    return {
+        'characters': names[:num_characters],
+        'species': names[num_characters:],
+        'partition_red': None if partition_red < 0 else partition_red,
+        'character_sets': section('character_sets', np.uint8, num_characters),
+        'species_red': section('species_red', np.uint8, num_species).astype(bool),
+        'character_counters': section('character_counters', '<i4', (num_characters, 2)),
+        'species_counters': section('species_counters', '<i4', (num_species, 2)),
+        'edges': np.unpackbits(section('character_rows', np.uint8, (num_characters, row_bytes)), axis=1,
+                               count=num_species, bitorder='little').astype(bool),
+        'red_edges': np.unpackbits(section('red_rows', np.uint8, (num_characters, row_bytes)), axis=1,
+                                   count=num_species, bitorder='little').astype(bool),
+    }
 
 class RedBlackGraph:
     def __init__(self, characters=None, species=None, edges=None):
@@ -21,98 +138,344 @@ class RedBlackGraph:
         else:
             self.species = species
 
-        if edges is None:
-            self.edges = {
-                'black': [],
-                'red': []
-            }
-        else:
-            self.edges = edges
+        # Integer node ids: characters and species are numbered separately, in insertion order
+        self._character_ids = {}
+        self._character_names = []
+        self._species_ids = {}
+        self._species_names = []
+
+        # Bitset adjacency: one bit-row per character over species ids, one per species over character ids
+        self._character_rows = []
+        self._species_rows = []
+        # Red edges, as bit-rows per character over species ids
+        self._red_rows = []
+        # Red species, as a bitset over species ids
+        self._red_species = 0
+
+        # Connected component index, rebuilt lazily after an edge removal may have split a component
+        self._components = None
+        # Read-only views handed out by neighbors and get_species_in_connected_component, built on
+        # first use: neighbor tuples by node, dropped when an edge of the node changes, and species
+        # frozensets by component label, dropped with the component index
+        self._neighbor_views = {}
+        self._component_views = {}
+
+        # Undo journal of edge and partition changes, only kept while a checkpoint is open
+        self._journal = None
+
+        # Incremental partition: characters whose counters changed since the last update_partition,
+        # characters indexed by red neighbor count, and the red species count of the last update
+        # (None until the first update classifies every character)
+        self._dirty = set()
+        self._red_buckets = collections.defaultdict(set)
+        self._partition_red = None
 
-        # Initialize graph    
-        self.graph = nx.Graph()
+        # Bucket queue of black species with at least one edge, by degree, and a lower bound on the smallest degree
+        self._degree_buckets = collections.defaultdict(set)
+        self._min_degree = 1
+
+        # Hot-path counters and timers (see enable_stats), None while disabled
+        self.stats = None
 
         # Initialize dictionaries for character node counters
         self.character_counters = {}
         for char in self.characters['intersection'] | self.characters['universal'] | self.characters['contained'] | self.characters['active']:
-            self.character_counters[char] = [0, 0]  # [red_neighbors, black_neighbors]
+            self._register_character(char)
 
         # Initialize dictionaries for species node counters
         self.species_counters = {}
         for sp in self.species['black'] | self.species['red']:
-            self.species_counters[sp] = [0, 0]  # [active_neighbors, inactive_neighbors]        
+            self._register_species(sp)
+            if sp in self.species['red']:
+                self._red_species |= 1 << self._species_ids[sp]
+
+        for color, color_edges in (edges or {}).items():
+            for character, species in color_edges:
+                self.add_edge(character, species, color)
+
+    def enable_stats(self):
+        """
+        Start counting hot-path operations and timing realize, component index rebuilds, partition
+        updates and rollbacks. Return the stats Counter; '_seconds' keys hold timers.
+        """
+        self.stats = collections.Counter()
+        return self.stats
+
+    def _register_character(self, character):
+        if character not in self._character_ids:
+            self._character_ids[character] = len(self._character_names)
+            self._character_names.append(character)
+            self._character_rows.append(0)
+            self._red_rows.append(0)
+            self._components = None
+        else:
+            self._red_buckets[self.character_counters[character][0]].discard(character)
+        self.character_counters[character] = [0, 0]  # [red_neighbors, black_neighbors]
+        self._red_buckets[0].add(character)
+        self._dirty.add(character)
+
+    def _update_character_counters(self, character, red, black):
+        counters = self.character_counters[character]
+        if red:
+            self._red_buckets[counters[0]].discard(character)
+            counters[0] += red
+            self._red_buckets[counters[0]].add(character)
+        counters[1] += black
+        self._dirty.add(character)
+
+    def _register_species(self, species):
+        if species not in self._species_ids:
+            self._species_ids[species] = len(self._species_names)
+            self._species_names.append(species)
+            self._species_rows.append(0)
+            self._components = None
+        self.species_counters[species] = [0, 0]  # [active_neighbors, inactive_neighbors]
 
     def add_character(self, character, subset):
         self.characters[subset].add(character)
-        self.character_counters[character]=[0,0]
-        self.graph.add_node(character, bipartite=0)
+        self._register_character(character)
 
     def add_species(self, species, color):
         self.species[color].add(species)
-        self.species_counters[species]=[0,0]
-        self.graph.add_node(species, bipartite=1)
+        self._register_species(species)
+        if color == 'red':
+            self._red_species |= 1 << self._species_ids[species]
+
+    def _unqueue_black_species(self, species):
+        self._degree_buckets[sum(self.species_counters[species])].discard(species)
+
+    def _queue_black_species(self, species):
+        degree = sum(self.species_counters[species])
+        if degree > 0 and species in self.species['black']:
+            self._degree_buckets[degree].add(species)
+            self._min_degree = min(self._min_degree, degree)
 
     def add_edge(self, character, species, color):
         if color not in ['black', 'red']:
             raise ValueError("Invalid edge color")
-        if character not in self.characters['intersection'] | self.characters['universal'] | self.characters['contained'] | self.characters['active']:
+        if character not in self._character_ids:
             raise ValueError("Invalid character")
-        if species not in self.species['black'] | self.species['red']:
+        if species not in self._species_ids:
             raise ValueError("Invalid species")
-        
+        c = self._character_ids[character]
+        s = self._species_ids[species]
+        if self._character_rows[c] >> s & 1:
+            raise ValueError("Edge already exists")
+        self._unqueue_black_species(species)
+
         # Update node counters
         if color == 'black':
             self.species_counters[species][1] += 1
-            if species in self.species['red']: # self.species_counters[species][0] > 0 : # red species
-                self.character_counters[character][0] += 1
+            if self._red_species >> s & 1: # self.species_counters[species][0] > 0 : # red species
+                self._update_character_counters(character, 1, 0)
             else:
-                self.character_counters[character][1] += 1
+                self._update_character_counters(character, 0, 1)
         else: # red edge
-            self.character_counters[character][0] += 1
+            self._update_character_counters(character, 1, 0)
             self.species_counters[species][0] += 1
             # If a new red species 
-            if species in self.species['black']:
+            if not self._red_species >> s & 1:
                 # Update species color
                 self.species['black'].remove(species)
                 self.species['red'].add(species)
+                self._red_species |= 1 << s
                 # Update species neighbors counters
-                for char_species in self.graph.neighbors(species):
-                    self.character_counters[char_species][0] += 1
-                    self.character_counters[char_species][1] += -1
-            
-        # Add edge to the set and to the graph
-        self.edges[color].append((character, species))
-        self.graph.add_edge(character, species, color=color)
+                for char_species in self._iter_characters(self._species_rows[s]):
+                    self._update_character_counters(char_species, 1, -1)
+
+        # An edge inside a component leaves the component index valid
+        if self._components is not None and self._components[0][c] != self._components[1][s]:
+            self._components = None
+
+        # Add edge to the bitsets
+        self._character_rows[c] |= 1 << s
+        self._species_rows[s] |= 1 << c
+        self._neighbor_views.pop(character, None)
+        self._neighbor_views.pop(species, None)
+        if color == 'red':
+            self._red_rows[c] |= 1 << s
+        self._queue_black_species(species)
+        if self._journal is not None:
+            self._journal.append(('add_edge', character, species, color))
+        if self.stats is not None:
+            self.stats['edges_added'] += 1
 
     def remove_edge(self, character, species, color):
-        if (character, species) not in self.edges[color]:
+        c = self._character_ids.get(character)
+        s = self._species_ids.get(species)
+        if c is None or s is None or not self._character_rows[c] >> s & 1 or (self._red_rows[c] >> s & 1) != (color == 'red'):
             raise ValueError("Invalid edge or color")
+        self._unqueue_black_species(species)
 
-        # Remove edge to the set and to the graph
-        self.edges[color].remove((character, species))
-        self.graph.remove_edge(character, species)
+        # Remove edge from the bitsets
+        self._character_rows[c] &= ~(1 << s)
+        self._species_rows[s] &= ~(1 << c)
+        self._neighbor_views.pop(character, None)
+        self._neighbor_views.pop(species, None)
+        if color == 'red':
+            self._red_rows[c] &= ~(1 << s)
+        self._components = None
+        if self._journal is not None:
+            self._journal.append(('remove_edge', character, species, color))
+        if self.stats is not None:
+            self.stats['edges_removed'] += 1
 
         # Update node counters
         if color == 'black': # black edge
             self.species_counters[species][1] += -1
-            if species in self.species['red']: # self.species_counters[species][0] > 0 : # red species
-                self.character_counters[character][0] += -1
+            if self._red_species >> s & 1: # self.species_counters[species][0] > 0 : # red species
+                self._update_character_counters(character, -1, 0)
             else:
-                self.character_counters[character][1] += -1
+                self._update_character_counters(character, 0, -1)
         else: # red edge
-            self.character_counters[character][0] += -1
+            self._update_character_counters(character, -1, 0)
             self.species_counters[species][0] += -1
             # If the species becomes black (removed species becomes black)
             if self.species_counters[species][0] == 0 :
-            # species_neighbors = set(self.graph.neighbors(species))
-            # if all(character not in self.characters['active'] for character in species_neighbors):
                 # Update species color
                 self.species['red'].discard(species)
                 self.species['black'].add(species)
+                self._red_species &= ~(1 << s)
                 # Update species neighbors counters
-                for char_species in self.graph.neighbors(species):
-                    self.character_counters[char_species][0] += -1
-                    self.character_counters[char_species][1] += 1
+                for char_species in self._iter_characters(self._species_rows[s]):
+                    self._update_character_counters(char_species, -1, 1)
+        self._queue_black_species(species)
+
+    def checkpoint(self):
+        """
+        Open a checkpoint and return its token. Every later edge and partition change is
+        journaled until the outermost checkpoint is released, and rollback(token) undoes
+        the changes made since the checkpoint in time proportional to their number.
+        """
+        if self._journal is None:
+            self._journal = []
+        if self.stats is not None:
+            self.stats['checkpoints'] += 1
+        return len(self._journal)
+
+    def rollback(self, token):
+        journal = self._journal
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+            stats['rollbacks'] += 1
+            stats['rollback_records'] += len(journal) - token
+        # Undo operations must not be journaled themselves
+        self._journal = None
+        while len(journal) > token:
+            record = journal.pop()
+            if record[0] == 'add_edge':
+                self.remove_edge(*record[1:])
+            elif record[0] == 'remove_edge':
+                self.add_edge(*record[1:])
+            elif record[0] == 'activate':
+                _, character, char_set = record
+                self.characters['active'].remove(character)
+                self.characters[char_set].add(character)
+            else: # partition
+                _, moves, dirty, partition_red = record
+                for character, old_set, new_set in reversed(moves):
+                    if new_set is not None:
+                        self.characters[new_set].remove(character)
+                    if old_set is not None:
+                        self.characters[old_set].add(character)
+                self._dirty |= dirty
+                self._partition_red = partition_red
+        self._journal = journal
+        if stats is not None:
+            stats['rollback_seconds'] += time.perf_counter() - start
+
+    def release(self, token):
+        """
+        Keep the changes made since the checkpoint. Releasing the outermost checkpoint stops journaling.
+        """
+        if token == 0:
+            self._journal = None
+
+    def _iter_characters(self, mask):
+        return map(self._character_names.__getitem__, iter_bits(mask))
+
+    def _iter_species(self, mask):
+        return map(self._species_names.__getitem__, iter_bits(mask))
+
+    def sorted_nodes(self, nodes):
+        """
+        Return character or species nodes sorted by node id, so that searches do not depend on set order.
+        """
+        return sorted(nodes, key=lambda node: self._character_ids[node] if node in self._character_ids else self._species_ids[node])
+
+    def neighbors(self, node):
+        """
+        Return the neighbors of a character or species node, ordered by node id, as a tuple that
+        is cached until an edge of the node changes.
+        """
+        view = self._neighbor_views.get(node)
+        if view is None:
+            if node in self._character_ids:
+                view = tuple(self._iter_species(self._character_rows[self._character_ids[node]]))
+            else:
+                view = tuple(self._iter_characters(self._species_rows[self._species_ids[node]]))
+            self._neighbor_views[node] = view
+        return view
+
+    def degree(self, node):
+        if node in self._character_ids:
+            return self._character_rows[self._character_ids[node]].bit_count()
+        return self._species_rows[self._species_ids[node]].bit_count()
+
+    def number_of_edges(self):
+        return sum(row.bit_count() for row in self._character_rows)
+
+    def get_characters(self):
+        return list(self._character_names)
+
+    def get_edges(self):
+        edges = {'black': [], 'red': []}
+        for c, character in enumerate(self._character_names):
+            red = self._red_rows[c]
+            for species in self._iter_species(self._character_rows[c] & ~red):
+                edges['black'].append((character, species))
+            for species in self._iter_species(red):
+                edges['red'].append((character, species))
+        return edges
+
+    def state_key(self):
+        """
+        Hashable key of the current state: the active characters, the characters still in the
+        partition and the edge bitsets. Edge colors follow from it, since active characters only
+        have red edges. Unchanged rows are shared between keys, so a key costs little more than a tuple.
+        """
+        active = 0
+        for character in self.characters['active']:
+            active |= 1 << self._character_ids[character]
+        partitioned = 0
+        for character in self.characters['intersection'] | self.characters['universal'] | self.characters['contained']:
+            partitioned |= 1 << self._character_ids[character]
+        return (active, partitioned, tuple(self._character_rows))
+
+    def fingerprint(self):
+        """
+        Hex digest of the node names and the state_key, telling whether two graphs are the same.
+        """
+        active, partitioned, rows = self.state_key()
+        digest = hashlib.sha256()
+        for part in (self._character_names, self._species_names, [format(active, 'x'), format(partitioned, 'x')],
+                     [format(row, 'x') for row in rows]):
+            digest.update(' '.join(part).encode() + b'\n')
+        return digest.hexdigest()
+
+    def has_red_sigma_graph(self):
+        """
+        Check for two active characters whose red neighborhoods overlap without one containing the other.
+        Active characters never gain edges, so neither of them can become universal red in its
+        component and the graph can no longer be fully reduced.
+        """
+        red_rows = [row for row in self._red_rows if row]
+        for i, row in enumerate(red_rows):
+            for other in red_rows[i + 1:]:
+                if row & other and row & ~other and other & ~row:
+                    return True
+        return False
 
     def get_species(self):
         return self.species['red'] , self.species['black']
@@ -131,86 +494,221 @@ class RedBlackGraph:
                 self.add_species(node, 'black')
 
         # Iterate over edges
-        for character in self.characters:
-            if data.get('bipartite') == 0:  # Character node
-                self.add_character(node, 'universal')
-            else:  # Species node
-                self.add_species(node, 'black')
-
         for u, v, data in nx_graph.edges(data=True):
             color = data.get('color', 'black')
             if nx_graph.nodes[u]['bipartite'] == 0 : # u is character
                 self.add_edge(u, v, color)
             else : # u is species
                 self.add_edge(v, u, color)
-            
-        # Initialize the graph object
-        self.graph = nx_graph
 
     def plot_graph(self):
-        char_nodes = [n for n,v in self.graph.nodes(data=True) if v['bipartite'] == 0] 
-        species_nodes = [n for n,v in self.graph.nodes(data=True) if v['bipartite'] == 1]
-        
-        pos = nx.bipartite_layout(self.graph, char_nodes, scale=3, align='horizontal')
-        nx.draw_networkx_nodes(self.graph, pos, nodelist=char_nodes, node_color='b', node_size=1500,alpha=0.2)
-        nx.draw_networkx_nodes(self.graph, pos, nodelist=species_nodes, node_color='gray', node_size=1500,alpha=0.2)
-        
-        black_edges = [(u,v) for u,v,e in self.graph.edges(data=True) if e['color'] == 'black']
-        red_edges =   [(u,v) for u,v,e in self.graph.edges(data=True) if e['color'] == 'red']
-        nx.draw_networkx_edges(self.graph, pos, edgelist=black_edges, edge_color='k')
-        nx.draw_networkx_edges(self.graph, pos, edgelist=red_edges, edge_color='r')
-        
-        char_labels = {node: node for node in char_nodes}
-        species_labels = {node: node for node in species_nodes}
-        labels = {**char_labels, **species_labels}
-        
-        nx.draw_networkx_labels(self.graph, pos, labels, font_size=10, font_color='k')
-        
-        plt.axis('off')
-        plt.show()
+        # matplotlib and networkx are only imported once a plot is requested
+        from plotting import plot_graph
+        plot_graph(self)
 
     def read_from_file(self, file_path):
+        """
+        Read a species x character binary matrix. Text files hold a "species characters" header line,
+        an optional empty line and one row of 0/1 values per species, and may be gzip-compressed. Files
+        written by write_packed_matrix are memory-mapped instead of parsed.
+        """
+        with open(file_path, 'rb') as file:
+            magic = file.read(len(PACKED_MAGIC))
+        if magic == PACKED_MAGIC:
+            self.from_rows(*read_packed_rows(file_path))
+            return
+        if magic[:2] != GZIP_MAGIC and os.path.getsize(file_path) <= SMALL_MATRIX_BYTES:
+            self._read_small_text_matrix(file_path)
+            return
+        import numpy as np
+        opener = gzip.open if magic[:2] == GZIP_MAGIC else open
+        with opener(file_path, 'rb') as file:
+            # Read the first line to get the number of species and characters
+            num_species, num_characters = map(int, file.readline().split())
+
+            # Stream the binary matrix in chunks, keeping only the 0/1 digits (the empty line is whitespace)
+            values = np.empty(num_species * num_characters, dtype=np.uint8)
+            filled = 0
+            while True:
+                chunk = file.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunk = byte_values()[np.frombuffer(chunk, dtype=np.uint8)]
+                if chunk.max() == INVALID_BYTE:
+                    raise ValueError(f"Invalid matrix value in {file_path}")
+                digits = chunk[chunk < WHITESPACE_BYTE]
+                if filled + len(digits) > len(values):
+                    raise ValueError(f"Too many matrix values in {file_path}")
+                values[filled:filled + len(digits)] = digits
+                filled += len(digits)
+            if filled != len(values):
+                raise ValueError(f"Expected {len(values)} matrix values in {file_path}, got {filled}")
+
+        self.from_matrix(values.reshape(num_species, num_characters))
+
+    def _read_small_text_matrix(self, file_path):
         with open(file_path, 'r') as file:
             # Read the first line to get the number of species and characters
             num_species, num_characters = map(int, file.readline().split())
+            # Splitting skips the empty line, like the streaming parser
+            values = file.read().split()
+        if len(values) != num_species * num_characters or not set(values) <= {'0', '1'}:
+            raise ValueError(f"Expected {num_species * num_characters} 0/1 matrix values in {file_path}")
 
-            # Skip the empty line
-            file.readline()
+        # Bit j of a species row is character j, so the digits are read in reverse
+        species_rows = [int(''.join(reversed(values[i * num_characters:(i + 1) * num_characters])) or '0', 2)
+                        for i in range(num_species)]
+        character_rows = [0] * num_characters
+        for i, row in enumerate(species_rows):
+            for j in iter_bits(row):
+                character_rows[j] |= 1 << i
+        self.from_rows(character_rows, species_rows)
 
-            # Initialize the species and characters sets
-            self.species = {'black': set(), 'red': set()}
-            self.characters = {'intersection': set(), 'universal': set(), 'contained': set(), 'active': set()}
+    def from_matrix(self, matrix):
+        """
+        Initialize the graph from a species x character binary matrix (a NumPy array), building
+        the bitsets and counters in one vectorized pass. Characters are named C1, C2, ... and
+        species S1, S2, ...; all characters start universal and all species black.
+        """
+        import numpy as np
+        matrix = np.asarray(matrix, dtype=bool)
+        # Pack each column into a bit-row over species ids and each row into a bit-row over character ids
+        character_rows = [int.from_bytes(row.tobytes(), 'little') for row in np.packbits(matrix.T, axis=1, bitorder='little')]
+        species_rows = [int.from_bytes(row.tobytes(), 'little') for row in np.packbits(matrix, axis=1, bitorder='little')]
+        self.from_rows(character_rows, species_rows)
 
-            # Read the binary matrix
-            adjacency_matrix = []
-            
-            for _ in range(num_species):
-                row = file.readline().strip().split()
-                adjacency_matrix.append([int(val) for val in row])
-
-            # Construct the graph from the adjacency matrix
-            for j in range(num_characters):
-                character_name = f'C{j + 1}'
-                self.add_character(character_name, 'universal')  # Assume all characters are initially universal
-
-            for i, row in enumerate(adjacency_matrix):
-                species_name = f'S{i + 1}'
-                self.add_species(species_name, 'black')  # Assume all species are initially black
-                # Add edges
-                for j, value in enumerate(row):
-                    if value == 1:
-                        character_name = f'C{j + 1}'
-                        self.add_edge(character_name, species_name, 'black')
-
-            # Initialize the graph object
-            self.graph = nx.Graph()
-            for character in self.characters['intersection'] | self.characters['universal'] | self.characters['contained'] | self.characters['active']:
-                self.graph.add_node(character, bipartite=0)
-            for species in self.species['black'] | self.species['red']:
-                self.graph.add_node(species, bipartite=1)
-            for color, edges in self.edges.items():
-                for u, v in edges:
-                    self.graph.add_edge(u, v, color=color)
+    def from_rows(self, character_rows, species_rows, character_names=None, species_names=None):
+        """
+        Initialize the graph from bit-rows: character_rows[j] has bit i set when species i has
+        character j, and species_rows is its transpose. Nodes are named C1, C2, ... and S1, S2, ...
+        unless names are given; all characters start universal and all species black.
+        """
+        num_characters, num_species = len(character_rows), len(species_rows)
+        self.__init__()
+
+        self._character_names = list(character_names or (f'C{j + 1}' for j in range(num_characters)))
+        self._character_ids = {name: j for j, name in enumerate(self._character_names)}
+        self._species_names = list(species_names or (f'S{i + 1}' for i in range(num_species)))
+        self._species_ids = {name: i for i, name in enumerate(self._species_names)}
+        self.characters['universal'] = set(self._character_names)  # Assume all characters are initially universal
+        self.species['black'] = set(self._species_names)  # Assume all species are initially black
+
+        self._character_rows = character_rows
+        self._species_rows = species_rows
+        self._red_rows = [0] * num_characters
+
+        self.character_counters = {name: [0, row.bit_count()] for name, row in zip(self._character_names, character_rows)}
+        self._red_buckets[0] = set(self._character_names)
+        self.species_counters = {name: [0, row.bit_count()] for name, row in zip(self._species_names, species_rows)}
+        for species in self._species_names:
+            self._queue_black_species(species)
+
+    def get_rows(self):
+        """
+        Return (character names, character bit-rows, species names, species bit-rows), in id order,
+        ignoring edge colors. The rows are those read by from_rows.
+        """
+        return list(self._character_names), list(self._character_rows), list(self._species_names), list(self._species_rows)
+
+    def to_matrix(self):
+        """
+        Return the species x character adjacency matrix of the current graph, ignoring edge colors.
+        """
+        import numpy as np
+        num_species = len(self._species_names)
+        num_bytes = (len(self._character_names) + 7) // 8
+        packed = np.frombuffer(b''.join(row.to_bytes(num_bytes, 'little') for row in self._species_rows), dtype=np.uint8)
+        packed = packed.reshape(num_species, num_bytes)
+        return np.unpackbits(packed, axis=1, count=len(self._character_names), bitorder='little').astype(bool)
+
+    def write_packed_matrix(self, file_path):
+        """
+        Write the adjacency matrix in the packed binary format: PACKED_MAGIC, the species and
+        character counts as little-endian uint32, then one bit-packed row per species.
+        """
+        import numpy as np
+        matrix = self.to_matrix()
+        with open(file_path, 'wb') as file:
+            file.write(PACKED_MAGIC)
+            file.write(np.array(matrix.shape, dtype='<u4').tobytes())
+            file.write(np.packbits(matrix, axis=1, bitorder='little').tobytes())
+
+    def write_snapshot(self, file_path):
+        """
+        Write the full graph state in the snapshot format (see snapshot_sections): node ids and
+        names, partition, species colors, counters and edge bitsets. read_snapshot restores it and
+        read_snapshot_arrays memory-maps it.
+        """
+        names = '\n'.join(self._character_names + self._species_names).encode('utf-8')
+        num_characters, num_species = len(self._character_names), len(self._species_names)
+        sections = snapshot_sections(num_characters, num_species, len(names))
+        codes = {character: code for code, name in enumerate(CHARACTER_SETS) for character in self.characters[name]}
+        row_bytes = (num_species + 7) // 8
+        contents = {
+            'names': names,
+            'character_sets': bytes(codes.get(character, NO_SET) for character in self._character_names),
+            'species_red': bytes(self._red_species >> s & 1 for s in range(num_species)),
+            'character_counters': struct.pack(f'<{2 * num_characters}i', *(count for character in self._character_names
+                                                                           for count in self.character_counters[character])),
+            'species_counters': struct.pack(f'<{2 * num_species}i', *(count for species in self._species_names
+                                                                     for count in self.species_counters[species])),
+            'character_rows': b''.join(row.to_bytes(row_bytes, 'little') for row in self._character_rows),
+            'red_rows': b''.join(row.to_bytes(row_bytes, 'little') for row in self._red_rows),
+        }
+        partition_red = -1 if self._partition_red is None else self._partition_red
+        with open(file_path, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC)
+            file.write(SNAPSHOT_HEADER.pack(num_characters, num_species, partition_red, len(names)))
+            for name, (offset, size) in sections.items():
+                file.write(b'\0' * (offset - file.tell()))
+                file.write(contents[name])
+
+    def read_snapshot(self, file_path):
+        """
+        Initialize the graph from a file written by write_snapshot. The next update_partition
+        reclassifies every character still in the partition.
+        """
+        with open(file_path, 'rb') as file:
+            data = file.read()
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a graph snapshot: {file_path}")
+        num_characters, num_species, _, names_bytes = SNAPSHOT_HEADER.unpack_from(data, len(SNAPSHOT_MAGIC))
+        sections = snapshot_sections(num_characters, num_species, names_bytes)
+
+        def section(name):
+            offset, size = sections[name]
+            return data[offset:offset + size]
+
+        self.__init__()
+        names = section('names').decode('utf-8').split('\n') if names_bytes else []
+        self._character_names = names[:num_characters]
+        self._character_ids = {name: j for j, name in enumerate(self._character_names)}
+        self._species_names = names[num_characters:]
+        self._species_ids = {name: i for i, name in enumerate(self._species_names)}
+        for character, code in zip(self._character_names, section('character_sets')):
+            if code != NO_SET:
+                self.characters[CHARACTER_SETS[code]].add(character)
+        for s, (species, red) in enumerate(zip(self._species_names, section('species_red'))):
+            self.species['red' if red else 'black'].add(species)
+            self._red_species |= red << s
+
+        row_bytes = (num_species + 7) // 8
+        rows, red_rows = section('character_rows'), section('red_rows')
+        self._character_rows = [int.from_bytes(rows[j * row_bytes:(j + 1) * row_bytes], 'little') for j in range(num_characters)]
+        self._red_rows = [int.from_bytes(red_rows[j * row_bytes:(j + 1) * row_bytes], 'little') for j in range(num_characters)]
+        self._species_rows = [0] * num_species
+        for j, row in enumerate(self._character_rows):
+            for s in iter_bits(row):
+                self._species_rows[s] |= 1 << j
+
+        counters = struct.unpack(f'<{2 * num_characters}i', section('character_counters'))
+        self.character_counters = {character: list(counters[2 * j:2 * j + 2]) for j, character in enumerate(self._character_names)}
+        counters = struct.unpack(f'<{2 * num_species}i', section('species_counters'))
+        self.species_counters = {species: list(counters[2 * i:2 * i + 2]) for i, species in enumerate(self._species_names)}
+        for character, (red, _) in self.character_counters.items():
+            self._red_buckets[red].add(character)
+        for species in self._species_names:
+            self._queue_black_species(species)
 
     def realize(self, character_name):
         # print('======')
@@ -218,42 +716,49 @@ class RedBlackGraph:
 
         if character_name not in self.characters['intersection'] | self.characters['universal'] | self.characters['contained']:
             raise ValueError(f"Invalid character name: {character_name}")
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+            stats['realize_calls'] += 1
 
-        # Find the connected component of the character
-        species_in_component =  self.get_species_in_connected_component(character_name)
-        # Get the neighbors of the character
-        neighbors = set(self.graph.neighbors(character_name))
+        # Find the connected component of the character and its neighbors, as bitsets over species ids
+        species_in_component = self._component_species_mask(character_name)
+        neighbors = self._character_rows[self._character_ids[character_name]]
 
         # Create red edges to non-neighbors in the same connected component and remove black edges
-        for species in species_in_component:
-            if species not in neighbors:
-                self.add_edge(character_name, species, 'red')
-            else:
-                self.remove_edge(character_name, species, 'black')
+        for species in self._iter_species(species_in_component & ~neighbors):
+            self.add_edge(character_name, species, 'red')
+        for species in self._iter_species(neighbors):
+            self.remove_edge(character_name, species, 'black')
 
         # Move the character to the 'active' set
         for char_set in {'intersection','universal','contained'} :
             if character_name in self.characters[char_set]:
                 self.characters[char_set].remove(character_name)
+                if self._journal is not None:
+                    self._journal.append(('activate', character_name, char_set))
         self.characters['active'].add(character_name)
         
         # Remove universal red characters
         while True:
-            universal_red_characters = []
-            # Search an universal red character
+            if stats is not None:
+                stats['red_universal_scans'] += 1
+            # Search an universal red character (the last one found): its neighbors are its whole component
+            char_to_remove = None
             for char in self.characters['active']:
-                char_neighbors = set(self.graph.neighbors(char))
-                species_in_component =  self.get_species_in_connected_component(char)
-                if (len(char_neighbors)>0) & (len(char_neighbors) == len(species_in_component)):
-                    universal_red_characters.append(char)
-            if universal_red_characters :
-                char_to_remove = universal_red_characters.pop()
-                neighbors = set(self.graph.neighbors(char_to_remove))
+                char_row = self._character_rows[self._character_ids[char]]
+                if char_row and char_row == self._component_species_mask(char):
+                    char_to_remove = char
+            if char_to_remove is not None :
                 # Remove red edges
-                for species in neighbors:
+                for species in self._iter_species(self._character_rows[self._character_ids[char_to_remove]]):
                     self.remove_edge(char_to_remove, species, 'red')
+                if stats is not None:
+                    stats['red_universal_removed'] += 1
             else :
                 break
+        if stats is not None:
+            stats['realize_seconds'] += time.perf_counter() - start
             
         #_,_,_,_ = self.update_partition()
         #self.print_status()
@@ -272,88 +777,283 @@ class RedBlackGraph:
         print(f'Character counters: {self.character_counters}')
         print('--')
         
+    def _component_index(self):
+        """
+        Return the connected component index as a tuple of
+        (character labels, species labels, species bitset per label, character bitset per label),
+        labelling the whole graph with a bitset breadth-first search if it is stale.
+        """
+        if self._components is not None:
+            return self._components
+        if self.stats is not None:
+            started = time.perf_counter()
+        character_labels = [None] * len(self._character_names)
+        species_labels = [None] * len(self._species_names)
+        component_species = []
+        component_characters = []
+        for start in range(len(self._character_names)):
+            if character_labels[start] is not None:
+                continue
+            # Expand one whole frontier at a time
+            species_mask = 0
+            characters_mask = frontier = 1 << start
+            while frontier:
+                new_species = 0
+                for c in iter_bits(frontier):
+                    new_species |= self._character_rows[c]
+                new_species &= ~species_mask
+                species_mask |= new_species
+                frontier = 0
+                for s in iter_bits(new_species):
+                    frontier |= self._species_rows[s]
+                frontier &= ~characters_mask
+                characters_mask |= frontier
+            label = len(component_species)
+            for c in iter_bits(characters_mask):
+                character_labels[c] = label
+            for s in iter_bits(species_mask):
+                species_labels[s] = label
+            component_species.append(species_mask)
+            component_characters.append(characters_mask)
+        # Isolated species form their own components
+        for s, label in enumerate(species_labels):
+            if label is None:
+                species_labels[s] = len(component_species)
+                component_species.append(1 << s)
+                component_characters.append(0)
+        self._components = (character_labels, species_labels, component_species, component_characters)
+        self._component_views = {}
+        if self.stats is not None:
+            self.stats['component_rebuilds'] += 1
+            self.stats['component_seconds'] += time.perf_counter() - started
+        return self._components
+
+    def _component_species_mask(self, character_name):
+        character_labels, _, component_species, _ = self._component_index()
+        return component_species[character_labels[self._character_ids[character_name]]]
+
+    def _remap_row(self, row, positions, size):
+        """
+        Return row with bit i moved to bit positions[i], as a bit-row of size bits.
+        """
+        bits = bytearray((size + 7) // 8)
+        for i in iter_bits(row):
+            p = positions[i]
+            bits[p >> 3] |= 1 << (p & 7)
+        return int.from_bytes(bits, 'little')
+
+    def _apply_state(self, subsets, red_species, red_rows):
+        """
+        Give a graph fresh from from_rows the character sets (subsets maps the characters still in
+        a set to its name), red species and red edges of a partly reduced graph, and rebuild the
+        counters and buckets that depend on them.
+        """
+        self.characters = {name: set() for name in self.characters}
+        for character in self._character_names:
+            if character in subsets:
+                self.characters[subsets[character]].add(character)
+        self._red_species = red_species
+        self._red_rows = red_rows
+        self.species = {'black': set(), 'red': set()}
+        for s, species in enumerate(self._species_names):
+            self.species['red' if red_species >> s & 1 else 'black'].add(species)
+
+        # Characters count their edges to red species as red, species their red edges as active
+        self._red_buckets = collections.defaultdict(set)
+        for character, row in zip(self._character_names, self._character_rows):
+            red = (row & red_species).bit_count()
+            self.character_counters[character] = [red, row.bit_count() - red]
+            self._red_buckets[red].add(character)
+        species_red_rows = [0] * len(self._species_names)
+        for j, row in enumerate(red_rows):
+            for s in iter_bits(row):
+                species_red_rows[s] |= 1 << j
+        self._degree_buckets = collections.defaultdict(set)
+        self._min_degree = 1
+        for species, row, red_row in zip(self._species_names, self._species_rows, species_red_rows):
+            active = red_row.bit_count()
+            self.species_counters[species] = [active, row.bit_count() - active]
+            self._queue_black_species(species)
+
+    def connected_components(self):
+        """
+        Split the graph into one RedBlackGraph per connected component, keeping node names,
+        character sets, species colors and edge colors. Isolated species are components of their own.
+        Each component is built with from_rows from the bit-rows of its nodes, renumbered in id order.
+        With stats enabled, each component starts its own stats.
+        """
+        _, _, component_species, component_characters = self._component_index()
+        num_characters, num_species = len(self._character_names), len(self._species_names)
+        # Id of every node in its component (components are disjoint, so one list serves them all)
+        character_positions = [None] * num_characters
+        species_positions = [None] * num_species
+        for characters_mask in component_characters:
+            for k, c in enumerate(iter_bits(characters_mask)):
+                character_positions[c] = k
+        for species_mask in component_species:
+            for k, s in enumerate(iter_bits(species_mask)):
+                species_positions[s] = k
+        subsets = {character: name for name, characters in self.characters.items() for character in characters}
+
+        components = []
+        for species_mask, characters_mask in zip(component_species, component_characters):
+            character_ids = list(iter_bits(characters_mask))
+            species_ids = list(iter_bits(species_mask))
+            if len(character_ids) == num_characters and len(species_ids) == num_species:
+                # The whole graph: ids are unchanged
+                character_rows, red_rows = list(self._character_rows), list(self._red_rows)
+                species_rows, red_species = list(self._species_rows), self._red_species
+            else:
+                character_rows = [self._remap_row(self._character_rows[c], species_positions, len(species_ids)) for c in character_ids]
+                red_rows = [self._remap_row(self._red_rows[c], species_positions, len(species_ids)) for c in character_ids]
+                species_rows = [self._remap_row(self._species_rows[s], character_positions, len(character_ids)) for s in species_ids]
+                red_species = self._remap_row(self._red_species & species_mask, species_positions, len(species_ids))
+            component = RedBlackGraph()
+            component.from_rows(character_rows, species_rows, [self._character_names[c] for c in character_ids],
+                                [self._species_names[s] for s in species_ids])
+            component._apply_state(subsets, red_species, red_rows)
+            if self.stats is not None:
+                component.enable_stats()
+                self.stats['component_copies'] += 1
+            components.append(component)
+        return components
+
     def get_species_in_connected_component(self, character_name):
-        component = nx.node_connected_component(self.graph, character_name)
-        species_in_component = {node for node in component if self.graph.nodes[node]['bipartite'] == 1}
-        return species_in_component
+        """
+        Return the species in the connected component of a character, as a frozenset that is
+        cached until the component index is rebuilt.
+        """
+        character_labels, _, component_species, _ = self._component_index()
+        label = character_labels[self._character_ids[character_name]]
+        view = self._component_views.get(label)
+        if view is None:
+            view = self._component_views[label] = frozenset(self._iter_species(component_species[label]))
+        return view
+
+    def count_species_in_connected_component(self, character_name):
+        return self._component_species_mask(character_name).bit_count()
 
-    def reduce(self, reduction, verbose=False):
-        for character in reduction:
+    def reduce(self, reduction, verbose=False, stop=None):
+        """
+        Realize the characters of reduction in order and return how many were realized: when
+        stop() returns True before a character, the reduction stops there.
+        """
+        for realized, character in enumerate(reduction):
+            if stop is not None and stop():
+                return realized
             self.realize(character)
             if verbose:
                 self.plot_graph()
+        return len(reduction)
 
     def update_partition(self):
-        temp_intersection = set()
-        temp_universal = set()
-        temp_contained = set()
+        """
+        Reclassify the characters whose counters changed since the last update, plus those that
+        a change in the number of red species can move between universal and the other sets.
+        A character that fits none of the sets leaves the partition for good.
+        """
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        num_red = len(self.species['red'])
+        if self._partition_red is None:
+            to_check = self.characters['intersection'] | self.characters['universal'] | self.characters['contained']
+        else:
+            to_check = self._dirty
+            if num_red != self._partition_red:
+                # Universal characters are the ones adjacent to every red species
+                to_check = to_check | self.characters['universal'] | self._red_buckets[num_red]
 
-        for character in  self.characters['intersection'] | self.characters['universal'] | self.characters['contained']:
-            
-            # Get the connected component and neighbors of the character
-            species_in_component = self.get_species_in_connected_component(character)
-            neighbors = set(self.graph.neighbors(character))
-            
-            # Check the rules for each set      
-            has_red_species = any(species in self.species['red'] for species in neighbors)
-            has_black_species = any(species in self.species['black'] for species in neighbors)
-            has_non_neighbor_red_species = any(species in self.species['red'] and species not in neighbors for species in species_in_component)            
+        moves = []
+        for character in to_check:
+            for old_set in ('intersection', 'universal', 'contained'):
+                if character in self.characters[old_set]:
+                    break
+            else:
+                continue # active or out of the partition
+
+            # Check the rules for each set
             has_red_species = self.character_counters[character][0] > 0
             has_black_species = self.character_counters[character][1] > 0
-            has_non_neighbor_red_species = self.character_counters[character][0] < len(self.species['red'])
+            has_non_neighbor_red_species = self.character_counters[character][0] < num_red
             # Compute partition
             if has_black_species and has_red_species and has_non_neighbor_red_species:
-                temp_intersection.add(character)
+                new_set = 'intersection'
             elif has_black_species and (not has_non_neighbor_red_species) :
-                temp_universal.add(character)
-            elif all(neighbor in self.species['red'] for neighbor in neighbors):
-                temp_contained.add(character)
-    
-        # Update the sets
-        self.characters['intersection'] = temp_intersection
-        self.characters['universal'] = temp_universal
-        self.characters['contained'] = temp_contained
+                new_set = 'universal'
+            elif not has_black_species: # all neighbors are red
+                new_set = 'contained'
+            else:
+                new_set = None
+            if new_set != old_set:
+                self.characters[old_set].remove(character)
+                if new_set is not None:
+                    self.characters[new_set].add(character)
+                moves.append((character, old_set, new_set))
+
+        if self._journal is not None:
+            self._journal.append(('partition', moves, self._dirty, self._partition_red))
+        self._dirty = set()
+        self._partition_red = num_red
+        if stats is not None:
+            stats['partition_updates'] += 1
+            stats['partition_checked'] += len(to_check)
+            stats['partition_seconds'] += time.perf_counter() - start
 
         return  self.characters['intersection'], self.characters['universal'], self.characters['contained'], self.characters['active']
 
     def get_graph(self) :
-        return self.graph
+        """
+        Build a NetworkX view of the current graph. The bitsets are the source of truth,
+        so the returned graph is a snapshot and is not kept in sync.
+        """
+        import networkx as nx
+        graph = nx.Graph()
+        for character in self._character_names:
+            graph.add_node(character, bipartite=0)
+        for species in self._species_names:
+            graph.add_node(species, bipartite=1)
+        for color, edges in self.get_edges().items():
+            graph.add_edges_from(edges, color=color)
+        return graph
 
     def get_minimal_size_black_species(self) :
-        # Compute degrees for the subset of species nodes
-        #species_nodes = [n for n,v in self.graph.nodes(data=True) if v['bipartite'] == 1] 
-        black_species_nodes = self.species['black']
-        species_degrees = {node: self.graph.degree(node) for node in black_species_nodes}
-        species_degrees = dict( (n,deg) for n,deg in species_degrees.items() if deg > 0 )
-        # Find the minimum degree
-        min_degree = min(species_degrees.values())
-    
+        # Advance the lower bound to the first non-empty degree bucket
+        while self._min_degree <= len(self._character_names) and not self._degree_buckets[self._min_degree]:
+            self._min_degree += 1
+        if self._min_degree > len(self._character_names):
+            raise ValueError("No black species with edges")
+
         # Return all nodes with the minimum degree
-        return [node for node, degree in species_degrees.items() if degree == min_degree]
+        return self.sorted_nodes(self._degree_buckets[self._min_degree])
 
     def compute_pi_U (self) :
         '''
         This function computes order pi_U of characters in intersection and universal according to the neighborhood in S^m_B 
         '''    
-        min_black_neighbors = self.species['black']
+        black_species = ((1 << len(self._species_names)) - 1) & ~self._red_species
+        min_black_neighbors = black_species
+        min_black_count = len(self.species['black'])
         minimal_intersection = ''
         
-         # Compute the minimum character in  intersection
-        for character in  self.characters['intersection'] :
-            character_black_neighbors= set(self.graph.neighbors(character)) & self.species['black']
-            if len(character_black_neighbors) < len(min_black_neighbors) :
+         # Compute the minimum character in  intersection, from the black neighbor counters
+        for character in  self.sorted_nodes(self.characters['intersection']) :
+            if self.character_counters[character][1] < min_black_count :
                 minimal_intersection = character
-                min_black_neighbors = character_black_neighbors
+                min_black_count = self.character_counters[character][1]
+        if minimal_intersection:
+            min_black_neighbors = self._character_rows[self._character_ids[minimal_intersection]] & black_species
         #print(f'Minimal intersection: {minimal_intersection}')
 
         species_out_of_minimal = []
         # Compute order pi_U
         if self.characters['intersection'] :
             species_out_of_minimal = [(minimal_intersection, 0)]
-            for character in self.characters['intersection'] | self.characters['universal'] :
-                s = set(self.graph.neighbors(character)).intersection(set(self.species['black'])) -  min_black_neighbors
-                if len(s) > 0 : 
-                    species_out_of_minimal.append( (character,len(s)) )
+            out_of_minimal = black_species & ~min_black_neighbors
+            for character in self.sorted_nodes(self.characters['intersection'] | self.characters['universal']) :
+                s = (self._character_rows[self._character_ids[character]] & out_of_minimal).bit_count()
+                if s > 0 : 
+                    species_out_of_minimal.append( (character,s) )
         # Return the maximal character in the order
         #print(species_out_of_minimal)
         return [s[0] for s in sorted(species_out_of_minimal, key=lambda x: x[1], reverse=True)]
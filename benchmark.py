@@ -0,0 +1,98 @@
+import RedBlackGraph as rbg
+import dolloone
+import generator
+from argparse import ArgumentParser
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+def run_instance(file_path, kind, max_nodes=None, timeout=None):
+    """
+    Read, split and solve one generated instance and return its record: the timings of
+    read_from_file, connected_components and solve, the verdict ('yes', 'no', 'unknown' or 'error'),
+    the search counters and the hot-path stats of the solver (realize, component and partition updates).
+    """
+    record = {'file': os.path.basename(file_path), 'expected': kind}
+
+    start = time.perf_counter()
+    graph = rbg.RedBlackGraph()
+    graph.read_from_file(file_path)
+    record['read_seconds'] = time.perf_counter() - start
+
+    graph.enable_stats()
+    start = time.perf_counter()
+    components = graph.connected_components()
+    record['components_seconds'] = time.perf_counter() - start
+    record['components'] = len(components)
+
+    results = []
+    start = time.perf_counter()
+    try:
+        for rb_cc_graph in components:
+            results.append(dolloone.solve(rb_cc_graph, max_nodes, timeout))
+    except ValueError as error:
+        record['error'] = f'{type(error).__name__}: {error}'
+    record['solve_seconds'] = time.perf_counter() - start
+
+    merged = dolloone.merge_results(results)
+    if 'error' in record:
+        record['verdict'] = 'error'
+    else:
+        record['verdict'] = {'success': 'yes', 'fail': 'no'}.get(merged.status, 'unknown')
+    record['nodes'] = merged.nodes
+    record['backtracks'] = merged.backtracks
+    # Taken from the components so that a component that raised is counted too
+    record['stats'] = dolloone.merge_stats([graph.stats] + [rb_cc_graph.stats for rb_cc_graph in components])
+    return record
+
+def run_benchmark(species, characters, densities, kinds, seeds, loss_probability=0.5, max_nodes=None, timeout=None):
+    """
+    Generate and solve one instance for every point of the parameter grid and return the records.
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as directory:
+        for num_species, num_characters, density, kind, seed in itertools.product(species, characters, densities, kinds, seeds):
+            generate = generator.yes_instance if kind == 'yes' else generator.no_instance
+            matrix = generate(num_species, num_characters, density, loss_probability, seed)
+            file_path = os.path.join(directory, generator.instance_name(kind, num_species, num_characters, density, seed))
+            generator.write_matrix(matrix, file_path)
+            record = run_instance(file_path, kind, max_nodes, timeout)
+            record.update(species=num_species, characters=num_characters, density=density, seed=seed)
+            records.append(record)
+            print(f"{record['file']}: {record['verdict']} in {record['solve_seconds']:.3f}s", file=sys.stderr)
+    return records
+
+def main(argv=None):
+    parser = ArgumentParser(description="Time the solver on generated Dollo-1 instances and record the results as JSON")
+    parser.add_argument("--species", type=int, nargs='+', default=[20, 50])
+    parser.add_argument("--characters", type=int, nargs='+', default=[20, 50])
+    parser.add_argument("--densities", type=float, nargs='+', default=[0.1, 0.3])
+    parser.add_argument("--kinds", choices=['yes', 'no'], nargs='+', default=['yes', 'no'])
+    parser.add_argument("--seeds", type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument("--loss-probability", dest="loss_probability", type=float, default=0.5)
+    parser.add_argument("--max-nodes", dest="max_nodes", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': run_benchmark(args.species, args.characters, args.densities, args.kinds, args.seeds,
+                                 args.loss_probability, args.max_nodes, args.timeout),
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -1,134 +1,852 @@
-import networkx as nx
-import matplotlib.pyplot as plt
-import copy
 import RedBlackGraph as rbg 
+from preprocess import Preprocessing, find_forbidden_triple
 from argparse import ArgumentParser
-import itertools
+import sys
+import collections
+import time
+import glob
+import json
+import os
+import re
 
-#######################
-# Read Input  #
-#######################
+# Largest component the exhaustive check accepts
+MAX_CHECK_CHARACTERS = 25
 
-parser = ArgumentParser()
+# Failed states solve remembers, least recently used first out
+CACHE_SIZE = 4096
 
-parser.add_argument("-f", "--input_file",
-                   dest="input_file", default=None,
-                   help="use this .csv file as input")
+# Seconds between two saves of a search checkpoint
+CHECKPOINT_INTERVAL = 60.0
 
-parser.add_argument("-v",
-                    action="store_true",
-                    help="verbose")
+def exhaustive_reduction(rb_graph, max_characters=MAX_CHECK_CHARACTERS):
+    """
+    Cross-check the solver by searching every realization order of the characters of rb_graph.
+    Orders are extended one character at a time: a prefix is pruned as soon as it creates a red
+    Sigma graph, and reduced states already known to fail are memoized. Return a complete
+    reduction order, or None if there is none. rb_graph is left unchanged.
+    """
+    characters = rb_graph.get_characters()
+    if len(characters) > max_characters:
+        raise ValueError(f"Exhaustive check limited to {max_characters} characters, got {len(characters)}")
+    failed_states = set()
+    order = []
 
-args = parser.parse_args()
-# Get problem input matrix
+    def extend():
+        if rb_graph.number_of_edges() == 0:
+            return True
+        state = rb_graph.state_key()
+        if state in failed_states:
+            return False
+        for character in rb_graph.sorted_nodes(rb_graph.characters['intersection'] | rb_graph.characters['universal'] | rb_graph.characters['contained']):
+            checkpoint = rb_graph.checkpoint()
+            rb_graph.realize(character)
+            order.append(character)
+            if not rb_graph.has_red_sigma_graph() and extend():
+                return True
+            order.pop()
+            rb_graph.rollback(checkpoint)
+        failed_states.add(state)
+        return False
 
-data_file = 'data/example_01.txt'
-if args.input_file is not None:
-    data_file = args.input_file
+    checkpoint = rb_graph.checkpoint()
+    found = extend()
+    # The remaining characters have no edges left and can be realized in any order
+    if found:
+        order.extend(character for character in characters if character not in order)
+    rb_graph.rollback(checkpoint)
+    rb_graph.release(checkpoint)
+    return order if found else None
 
-# verbose
-verbose = args.v
+class SolverResult:
+    """
+    Outcome of solve: the reduction order, whether it realizes every character and why the
+    search stopped ('success', 'fail', 'node_limit', 'timeout' or 'cancelled'), with search counters.
+    stats holds the graph's hot-path counters when they are enabled, else None, and witness the
+    forbidden characters when screening rejected the graph.
+    """
+    def __init__(self):
+        self.reduction = []
+        self.success = False
+        self.status = None
+        self.nodes = 0
+        self.backtracks = 0
+        self.stats = None
+        self.witness = None
 
-########################
+    def __repr__(self):
+        return f'SolverResult(status={self.status!r}, reduction={self.reduction}, nodes={self.nodes}, backtracks={self.backtracks})'
+
+def encode_state(state):
+    """
+    Write a RedBlackGraph.state_key as JSON-friendly hex strings, and decode_state back.
+    """
+    active, partitioned, rows = state
+    return [format(active, 'x'), format(partitioned, 'x'), [format(row, 'x') for row in rows]]
+
+def decode_state(encoded):
+    active, partitioned, rows = encoded
+    return int(active, 16), int(partitioned, 16), tuple(int(row, 16) for row in rows)
+
+class SearchCheckpoint:
+    """
+    Progress file of a long solve: a snapshot of the graph the search started from
+    (file_path + '.rbs') and, in file_path, the fingerprint of that graph
+    (RedBlackGraph.fingerprint) and where the search stopped: the search frontier (the index of
+    the branch explored at every universal-case choice point), the steps taken since the last
+    branch was entered, the search counters and the failed-state cache. solve saves it every
+    interval seconds and when it stops early; given a loaded checkpoint, it resumes by replaying
+    the branches and steps, which is deterministic from the snapshot, so the search goes on as if
+    it had never stopped.
+    """
+    def __init__(self, file_path, interval=CHECKPOINT_INTERVAL):
+        self.file_path = file_path
+        self.snapshot_path = file_path + '.rbs'
+        self.interval = interval
+        self.resumed = False
+        self.branches = []
+        self.steps = 0
+        self.nodes = 0
+        self.backtracks = 0
+        self.failed_states = []
+        self.fingerprint = None
+        self.saved = None
+
+    @classmethod
+    def load(cls, file_path, interval=CHECKPOINT_INTERVAL):
+        """
+        Return the checkpoint saved in file_path and the graph its search started from.
+        """
+        with open(file_path) as file:
+            progress = json.load(file)
+        checkpoint = cls(file_path, interval)
+        checkpoint.resumed = True
+        checkpoint.branches = progress['branches']
+        checkpoint.steps = progress['steps']
+        checkpoint.nodes = progress['nodes']
+        checkpoint.backtracks = progress['backtracks']
+        checkpoint.failed_states = [decode_state(state) for state in progress['failed_states']]
+        checkpoint.fingerprint = progress.get('fingerprint')
+        rb_graph = rbg.RedBlackGraph()
+        rb_graph.read_snapshot(os.path.join(os.path.dirname(file_path), progress['snapshot']))
+        return checkpoint, rb_graph
+
+    def begin(self, rb_graph):
+        """
+        Called by solve before searching: a new checkpoint saves the snapshot of rb_graph and an empty frontier.
+        """
+        if not self.resumed:
+            self.fingerprint = rb_graph.fingerprint()
+            rb_graph.write_snapshot(self.snapshot_path)
+            self.save([], 0, SolverResult(), [])
+        self.saved = time.perf_counter()
+
+    def due(self):
+        return time.perf_counter() - self.saved >= self.interval
+
+    def save(self, branches, steps, result, failed_states):
+        """
+        Write the frontier, steps, counters and failed states (least recently used first),
+        replacing the previous progress file atomically.
+        """
+        progress = {'snapshot': os.path.basename(self.snapshot_path), 'fingerprint': self.fingerprint,
+                    'branches': branches, 'steps': steps,
+                    'nodes': result.nodes, 'backtracks': result.backtracks,
+                    'failed_states': [encode_state(state) for state in failed_states]}
+        with open(self.file_path + '.tmp', 'w') as file:
+            json.dump(progress, file)
+        os.replace(self.file_path + '.tmp', self.file_path)
+        self.saved = time.perf_counter()
+
+    def remove(self):
+        for file_path in (self.file_path, self.snapshot_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+def enter_branch(rb_graph, choice_point, index, reduction, verbose=False):
+    """
+    Explore branch index of a universal-case choice point: reduce the characters of its
+    index-th minimal species.
+    """
+    choice_point[3] = index
+    s0 = choice_point[2][index]
+    if rb_graph.stats is not None:
+        rb_graph.stats['branches'] += 1
+    next_characters = rb_graph.neighbors(s0)
+    #print('Try:', s0, next_characters)
+    rb_graph.reduce(next_characters, verbose)
+    reduction.extend(next_characters)
+
+def next_branch(rb_graph, choice_points, reduction, verbose=False):
+    """
+    Apply the next untried minimal species of the innermost universal-case choice point,
+    rolling back failed branches and exhausted choice points. Return False when none is left.
+    """
+    while choice_points:
+        choice_point = choice_points[-1]
+        checkpoint, length, minimal_species, index = choice_point
+        # Undo the failed branch
+        rb_graph.rollback(checkpoint)
+        del reduction[length:]
+        if index + 1 < len(minimal_species):
+            enter_branch(rb_graph, choice_point, index + 1, reduction, verbose)
+            return True
+        choice_points.pop()
+        rb_graph.release(checkpoint)
+    return False
+
+def solve(rb_graph, max_nodes=None, timeout=None, verbose=False, jobs=1, stop=None, screen=True, cache_size=CACHE_SIZE,
+          checkpoint=None, shared_nodes=None):
+    """
+    Search for a reduction of rb_graph with an explicit stack of universal-case choice points.
+    The search stops early once max_nodes reduction steps have been expanded, timeout seconds
+    have elapsed or stop() returns True; the last two are also checked between the characters a
+    contained-case or pi_U step realizes. rb_graph is reduced in place.
+
+    With screen, a graph that has not been reduced yet is first screened for a forbidden
+    submatrix (find_forbidden_triple) and fails without searching if one is found.
+
+    States (RedBlackGraph.state_key) whose whole subtree failed are kept in an LRU cache of
+    cache_size entries, so a branch that reaches one again backtracks right away.
+
+    With jobs > 1 the branches of the first universal case are explored by solve_branches on
+    worker processes, and rb_graph is left at that choice point. shared_nodes is the node budget
+    those workers share (a multiprocessing Value of the steps left): every step takes one, and the
+    search stops with 'node_limit' when none is left.
+
+    With a SearchCheckpoint, the progress is saved periodically and branches are explored
+    sequentially. A loaded checkpoint must be solved on the graph SearchCheckpoint.load returned:
+    the search replays its way back to where the checkpoint was saved and goes on from there, with
+    the saved counters. max_nodes then counts the steps taken after the replay, so every resumed
+    run makes progress.
+    """
+    result = SolverResult()
+    reduction = result.reduction
+    deadline = None if timeout is None else time.perf_counter() + timeout
+
+    def interrupted():
+        if deadline is not None and time.perf_counter() > deadline:
+            result.status = 'timeout'
+            return True
+        if stop is not None and stop():
+            result.status = 'cancelled'
+            return True
+        return False
+    # Choice points of the universal case: [checkpoint, reduction length, minimal species, index of the branch explored]
+    choice_points = []
+    # States known to fail, and the states of the current path with the choice point depth they were reached at
+    failed_states = collections.OrderedDict()
+    path_states = []
+    # Steps taken when the current branch was entered, and when max_nodes started counting
+    entry_nodes = budget_start = 0
+    # When resuming, the branches to replay and then the steps left to replay (None until the branches are replayed)
+    replaying = checkpoint is not None and checkpoint.resumed
+    resume = []
+    replay_steps = None
+    if checkpoint is not None:
+        checkpoint.begin(rb_graph)
+    if replaying:
+        resume = checkpoint.branches
+        if not resume:
+            replay_steps = checkpoint.steps
+        for state in checkpoint.failed_states:
+            failed_states[state] = True
+
+    if screen and not rb_graph.characters['active'] and not rb_graph.species['red']:
+        if rb_graph.stats is not None:
+            start = time.perf_counter()
+        result.witness = find_forbidden_triple(rb_graph)
+        if rb_graph.stats is not None:
+            rb_graph.stats['screen_calls'] += 1
+            rb_graph.stats['screen_rejects'] += result.witness is not None
+            rb_graph.stats['screen_seconds'] += time.perf_counter() - start
+        if result.witness is not None:
+            result.status = 'fail'
+            if rb_graph.stats is not None:
+                result.stats = collections.Counter(rb_graph.stats)
+            return result
+
+    while True:
+        if replaying and replay_steps == 0:
+            # Back where the checkpoint was saved: continue with the saved counters
+            result.nodes, result.backtracks = checkpoint.nodes, checkpoint.backtracks
+            entry_nodes = checkpoint.nodes - checkpoint.steps
+            budget_start = result.nodes
+            replaying = False
+            replay_steps = None
+        elif replay_steps is not None:
+            replay_steps -= 1
+        if max_nodes is not None and not replaying and result.nodes - budget_start >= max_nodes:
+            result.status = 'node_limit'
+            break
+        if interrupted():
+            break
+        if shared_nodes is not None:
+            with shared_nodes.get_lock():
+                available = shared_nodes.value > 0
+                shared_nodes.value -= available
+            if not available:
+                result.status = 'node_limit'
+                break
+        result.nodes += 1
+
+        Ci,Cu,Cc,Ca = rb_graph.update_partition()
+
+        # States before the first choice point are never reached twice
+        known_failure = False
+        if cache_size and choice_points:
+            state = rb_graph.state_key()
+            known_failure = state in failed_states
+            if known_failure:
+                failed_states.move_to_end(state)
+                if rb_graph.stats is not None:
+                    rb_graph.stats['cache_hits'] += 1
+            else:
+                path_states.append((len(choice_points), state))
 
-def all_permutations(rb_graph):
-    graph=rb_graph.get_graph()
-    characters= [node for node,data in graph.nodes(data=True) if data.get('bipartite') == 0]  
-    for perm in itertools.permutations(characters) :
-        rb_graph_copy = copy.deepcopy(rb_graph)
-        rb_graph_copy.reduce(perm)
-        Grb=rb_graph_copy.get_graph()
         # If no active characters
-        if len(Grb.edges()) == 0 : # Sigma graph
-            print(f'SUCESS: {perm} all permutations')
-            return 
-    print(f'NO DOLLO-1 all permutations')
-    return
-
-def reduction_recursive(rb_graph) :
-
-    Ci,Cu,Cc,Ca = rb_graph.update_partition()
-    Sr, Sb =rb_graph.get_species()
-    Grb=rb_graph.get_graph()
-    
-    # If no active characters
-    if len(Ci | Cu | Cc) == 0 : 
-        if len(Grb.edges()) > 0 : # Sigma graph
-            return ['fail']
+        if known_failure or len(Ci | Cu | Cc) == 0 :
+            if not known_failure and rb_graph.number_of_edges() == 0 :
+                result.success = True
+                result.status = 'success'
+                break
+            # Sigma graph, or a state that already failed
+            result.backtracks += 1
+            if not next_branch(rb_graph, choice_points, reduction, verbose):
+                result.status = 'fail'
+                break
+            # The states of the abandoned branch have failed
+            depth = len(choice_points)
+            while path_states and path_states[-1][0] >= depth:
+                failed_states[path_states.pop()[1]] = True
+                if len(failed_states) > cache_size:
+                    failed_states.popitem(last=False)
+            entry_nodes = result.nodes
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save([choice_point[3] for choice_point in choice_points], 0, result, failed_states)
+        elif len(Ci) == 0 :
+            if len(Cu) == 0 :
+                #print('CASE CONTAINED')
+                next_characters = rb_graph.sorted_nodes(Cc)
+                realized = rb_graph.reduce(next_characters, verbose, interrupted)
+                reduction.extend(next_characters[:realized])
+                if realized < len(next_characters):
+                    break
+            # Ci empty
+            else :
+                #print('CASE UNIVERSAL')
+                minimal_species = rb_graph.get_minimal_size_black_species()
+                #print('Minimal size species:', minimal_species)
+                if jobs > 1 and checkpoint is None and not choice_points and len(minimal_species) > 1 :
+                    remaining_nodes = None if max_nodes is None else max_nodes - result.nodes
+                    remaining_time = None if deadline is None else max(0, deadline - time.perf_counter())
+                    branch_result = solve_branches(rb_graph, minimal_species, jobs, remaining_nodes, remaining_time)
+                    reduction.extend(branch_result.reduction)
+                    result.nodes += branch_result.nodes
+                    result.backtracks += branch_result.backtracks
+                    result.success = branch_result.success
+                    result.status = branch_result.status
+                    result.stats = branch_result.stats
+                    break
+                depth = len(choice_points)
+                start_index = 0
+                if replaying and depth < len(resume):
+                    if resume[depth] >= len(minimal_species):
+                        raise ValueError("Search checkpoint does not match the graph")
+                    # The earlier branches failed before the checkpoint was saved
+                    start_index = resume[depth]
+                # A new choice point has nothing to roll back before its first branch
+                choice_points.append([rb_graph.checkpoint(), len(reduction), minimal_species, start_index])
+                enter_branch(rb_graph, choice_points[-1], start_index, reduction, verbose)
+                entry_nodes = result.nodes
+                if replaying and depth == len(resume) - 1:
+                    # The branches are replayed, now the steps taken after them
+                    replay_steps = checkpoint.steps
+                if checkpoint is not None and not replaying and checkpoint.due():
+                    checkpoint.save([choice_point[3] for choice_point in choice_points], 0, result, failed_states)
+        # Ci is not empty
         else :
-            return list()
-        
-    if len(Ci) == 0 :
-        if len(Cu) == 0 :
-            #print('CASE CONTAINED')
-            next_characters = list(Cc)
-            rb_graph.reduce(next_characters,verbose)
-            reduction_extension = reduction_recursive(rb_graph)
-            return next_characters+reduction_extension
-        # Ci empty
-        else :
-            #print('CASE UNIVERSAL')            
-            minimal_species = rb_graph.get_minimal_size_black_species()
-            #print('Minimal size species:', minimal_species)
-
-            # Cycle on minimal species
-            for s0 in minimal_species :
-                rb_graph_copy = copy.deepcopy(rb_graph)
-                next_characters = list(Grb.neighbors(s0))
-                #print('Try:', s0, next_characters)
-                rb_graph_copy.reduce(next_characters, verbose)
-                reduction_extension = reduction_recursive(rb_graph_copy)
-             
-                if 'fail' not in reduction_extension :
-                    return next_characters+reduction_extension
-            
-                #print('FAIL WITH:', s0)
-                #print('=======')
-            return ['fail']
-        
-    # Ci is not empty
-    else : 
-        #print('CASE pi_U')
-        next_characters = rb_graph.compute_pi_U()
-        rb_graph.reduce(next_characters, verbose)
-        reduction_extension = reduction_recursive(rb_graph)
-        return next_characters+reduction_extension
+            #print('CASE pi_U')
+            next_characters = rb_graph.compute_pi_U()
+            realized = rb_graph.reduce(next_characters, verbose, interrupted)
+            reduction.extend(next_characters[:realized])
+            if realized < len(next_characters):
+                break
+
+    # A search stopped while replaying leaves the loaded checkpoint as it was
+    if checkpoint is not None and not replaying and result.status not in ('success', 'fail'):
+        checkpoint.save([choice_point[3] for choice_point in choice_points], result.nodes - entry_nodes, result, failed_states)
+
+    # Keep the reduced graph
+    if choice_points:
+        rb_graph.release(choice_points[0][0])
+    if rb_graph.stats is not None:
+        result.stats = merge_stats([rb_graph.stats, result.stats])
+    return result
+
+# Index of the earliest successful branch and steps left (None without a node budget),
+# shared with the solve_branches workers
+_branch_cutoff = None
+_branch_nodes = None
+
+def init_branch_worker(branch_cutoff, branch_nodes):
+    global _branch_cutoff, _branch_nodes
+    _branch_cutoff = branch_cutoff
+    _branch_nodes = branch_nodes
+
+def solve_branch(rb_graph, s0, index, deadline=None):
+    """
+    Worker entry point: reduce the characters of minimal species s0 and search the rest, within
+    the shared node budget and until the wall-clock deadline. The search is cancelled as soon as
+    an earlier branch has succeeded.
+    """
+    # The parent's counters are already accounted for
+    if rb_graph.stats is not None:
+        rb_graph.enable_stats()
+        rb_graph.stats['branches'] += 1
+    next_characters = rb_graph.neighbors(s0)
+    rb_graph.reduce(next_characters)
+    timeout = None if deadline is None else max(0, deadline - time.time())
+    result = solve(rb_graph, None, timeout, stop=lambda: _branch_cutoff.value < index, shared_nodes=_branch_nodes)
+    result.reduction[:0] = next_characters
+    return result
+
+def solve_branches(rb_graph, minimal_species, jobs, max_nodes=None, timeout=None):
+    """
+    Explore the branches of a universal-case choice point on a process pool. The branches share
+    max_nodes steps and a deadline timeout seconds away. A successful branch cancels the branches
+    after it, and the outcome is that of the first branch in minimal species order that did not
+    fail, so a decided result is the one the sequential search finds.
+    """
+    # Process pools are only imported when used, to keep startup fast
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    cutoff = multiprocessing.RawValue('i', len(minimal_species))
+    shared_nodes = None if max_nodes is None else multiprocessing.Value('q', max_nodes)
+    deadline = None if timeout is None else time.time() + timeout
+    results = [None] * len(minimal_species)
+    errors = [None] * len(minimal_species)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_branch_worker, initargs=(cutoff, shared_nodes)) as pool:
+        futures = {pool.submit(solve_branch, rb_graph, s0, i, deadline): i for i, s0 in enumerate(minimal_species)}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            i = futures[future]
+            if future.exception() is not None:
+                errors[i] = future.exception()
+                continue
+            results[i] = future.result()
+            if results[i].success and i < cutoff.value:
+                cutoff.value = i
+                for other, j in futures.items():
+                    if j > i:
+                        other.cancel()
+
+    # The sequential search stops at the first branch that does not fail: branches after it,
+    # and their errors, would never have been reached
+    for first, result in enumerate(results):
+        if errors[first] is not None:
+            raise errors[first]
+        if result.status != 'fail':
+            break
+
+    merged = SolverResult()
+    for result in results:
+        if result is not None:
+            merged.nodes += result.nodes
+            merged.backtracks += result.backtracks
+    merged.stats = merge_stats(result.stats for result in results if result is not None)
+    merged.status = results[first].status
+    if results[first].success:
+        merged.reduction = results[first].reduction
+        merged.success = True
+    return merged
+
+def solve_component(rb_graph, max_nodes=None, timeout=None, verbose=False, branch_jobs=1, screen=True):
+    """
+    Worker entry point: solve one connected component and return its SolverResult.
+    """
+    return solve(rb_graph, max_nodes, timeout, verbose, branch_jobs, screen=screen)
+
+def solve_components(components, jobs=1, max_nodes=None, timeout=None, verbose=False, branch_jobs=1, screen=True):
+    """
+    Solve independent connected components and return their results in component order.
+    With jobs > 1 the components are sent to a process pool, largest first. Branches are only
+    explored in parallel (branch_jobs > 1) when the components are solved one after another.
+    """
+    if jobs <= 1 or len(components) <= 1:
+        return [solve_component(rb_graph, max_nodes, timeout, verbose, branch_jobs, screen) for rb_graph in components]
+    # Balance the pool by submitting the biggest components first
+    by_size = sorted(range(len(components)), key=lambda i: components[i].number_of_edges(), reverse=True)
+    results = [None] * len(components)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {i: pool.submit(solve_component, components[i], max_nodes, timeout, screen=screen) for i in by_size}
+        for i, future in futures.items():
+            results[i] = future.result()
+    return results
+
+def checkpoint_path(checkpoint_dir, file_path, index):
+    """
+    Return the search checkpoint file of component index of an input file.
+    """
+    name = re.sub(r'[^\w.-]', '_', file_path)
+    return os.path.join(checkpoint_dir, f'{name}.{index}.json')
+
+def solve_checkpointed(rb_graph, file_path, max_nodes=None, timeout=None, verbose=False, screen=True,
+                       interval=CHECKPOINT_INTERVAL):
+    """
+    Solve one connected component, saving its search checkpoint to file_path. If file_path
+    holds a checkpoint of the same graph (same fingerprint), the search resumes from it; a
+    checkpoint of another graph, left by a run on a changed input or with other options, is
+    discarded and the search starts over on rb_graph. The checkpoint files are removed once
+    the component is decided.
+    """
+    checkpoint = None
+    if os.path.exists(file_path):
+        stats = rb_graph.stats
+        checkpoint, saved_graph = SearchCheckpoint.load(file_path, interval)
+        if checkpoint.fingerprint == rb_graph.fingerprint():
+            rb_graph = saved_graph
+            if stats is not None:
+                rb_graph.enable_stats()
+        else:
+            checkpoint.remove()
+            checkpoint = None
+    if checkpoint is None:
+        checkpoint = SearchCheckpoint(file_path, interval)
+    result = solve(rb_graph, max_nodes, timeout, verbose, screen=screen, checkpoint=checkpoint)
+    if result.status in ('success', 'fail'):
+        checkpoint.remove()
+    return result
+
+def merge_stats(all_stats):
+    """
+    Add up stats Counters, skipping None. Return None if there are none.
+    """
+    total = None
+    for stats in all_stats:
+        if stats is not None:
+            if total is None:
+                total = collections.Counter()
+            total.update(stats)
+    return total
+
+def merge_results(results):
+    """
+    Merge per-component results into one: the reductions are concatenated in component order.
+    """
+    merged = SolverResult()
+    for result in results:
+        merged.reduction.extend(result.reduction)
+        merged.nodes += result.nodes
+        merged.backtracks += result.backtracks
+    merged.stats = merge_stats(result.stats for result in results)
+    statuses = [result.status for result in results]
+    merged.success = all(result.success for result in results)
+    if merged.success:
+        merged.status = 'success'
+    elif 'fail' in statuses:
+        merged.status = 'fail'
+    else:
+        merged.status = next(status for status in statuses if status != 'success')
+    return merged
+
+def is_matrix_file(file_path):
+    """
+    Tell matrix files from manifests by their start: the packed or gzip magic, or a
+    "species characters" header line.
+    """
+    with open(file_path, 'rb') as file:
+        head = file.readline(256)
+    if head.startswith(rbg.PACKED_MAGIC) or head.startswith(rbg.GZIP_MAGIC):
+        return True
+    counts = head.split()
+    return len(counts) == 2 and all(count.isdigit() for count in counts)
+
+def read_manifest(manifest_path):
+    """
+    Return the input files listed in a manifest, one path per line, relative to the manifest.
+    Blank lines and # comments are ignored.
+    """
+    files = []
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                files.append(os.path.join(os.path.dirname(manifest_path), line))
+    return files
+
+def batch_inputs(specs):
+    """
+    Expand --batch arguments into input files: a directory gives its files, a pattern with glob
+    characters gives its matches and a matrix file is itself an input. @file, or any other file,
+    is a manifest (see read_manifest).
+    """
+    files = []
+    for spec in specs:
+        if spec.startswith('@'):
+            files.extend(read_manifest(spec[1:]))
+        elif os.path.isdir(spec):
+            files.extend(sorted(os.path.join(spec, name) for name in os.listdir(spec)
+                                if not name.startswith('.') and os.path.isfile(os.path.join(spec, name))))
+        elif glob.has_magic(spec):
+            files.extend(sorted(glob.glob(spec)))
+        elif is_matrix_file(spec):
+            files.append(spec)
+        else:
+            files.extend(read_manifest(spec))
+    return files
+
+def solve_file(file_path, max_nodes=None, timeout=None, stats=False, preprocess=False, screen=True,
+               checkpoint_dir=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Batch worker: read, split and solve one matrix file and return its JSON record with the
+    verdict ('yes', 'no', 'unknown' or 'error'), the merged reduction, component stats and timings
+    (with the witness of components rejected by screening). With stats, the record also holds the
+    hot-path counters. With preprocess, duplicates and constant characters are removed before
+    solving and the record holds the reduced sizes. With checkpoint_dir, each component search is
+    checkpointed there (see solve_checkpointed) and resumes from an earlier interrupted run.
+    """
+    record = {'file': file_path}
+    start = time.perf_counter()
+    try:
+        graph = rbg.RedBlackGraph()
+        graph.read_from_file(file_path)
+        record['species'] = len(graph.get_species()[0]) + len(graph.get_species()[1])
+        record['characters'] = len(graph.get_characters())
+        record['load_seconds'] = time.perf_counter() - start
+        if preprocess:
+            preprocessing = Preprocessing(graph)
+            graph = preprocessing.graph
+            record['preprocessing'] = preprocessing.summary()
+        if stats:
+            graph.enable_stats()
+
+        record['components'] = []
+        results = []
+        for i, rb_cc_graph in enumerate(graph.connected_components()):
+            n_red, n_black = rb_cc_graph.get_species()
+            component = {'characters': len(rb_cc_graph.get_characters()), 'species': len(n_red) + len(n_black),
+                         'edges': rb_cc_graph.number_of_edges()}
+            component_start = time.perf_counter()
+            if checkpoint_dir is None:
+                result = solve(rb_cc_graph, max_nodes, timeout, screen=screen)
+            else:
+                result = solve_checkpointed(rb_cc_graph, checkpoint_path(checkpoint_dir, file_path, i), max_nodes, timeout,
+                                            screen=screen, interval=checkpoint_interval)
+            component.update(status=result.status, nodes=result.nodes, backtracks=result.backtracks,
+                             seconds=time.perf_counter() - component_start)
+            if result.witness is not None:
+                component['witness'] = list(result.witness)
+            record['components'].append(component)
+            results.append(result)
+        merged = merge_results(results)
+        record['verdict'] = {'success': 'yes', 'fail': 'no'}.get(merged.status, 'unknown')
+        if merged.success and preprocess:
+            merged.reduction = preprocessing.expand(merged.reduction)
+        record['reduction'] = merged.reduction if merged.success else None
+        if stats:
+            record['stats'] = merge_stats([graph.stats, merged.stats])
+    except (ValueError, OSError) as error:
+        record['verdict'] = 'error'
+        record['error'] = f'{type(error).__name__}: {error}'
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+def solve_batch(files, output, jobs=1, max_nodes=None, timeout=None, stats=False, preprocess=False, screen=True,
+                checkpoint_dir=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Solve many matrix files and write one JSON line per file to output, in input order.
+    With jobs > 1 the files are solved on a process pool.
+    """
+    if jobs <= 1:
+        records = (solve_file(file_path, max_nodes, timeout, stats, preprocess, screen, checkpoint_dir, checkpoint_interval)
+                   for file_path in files)
+        for record in records:
+            output.write(json.dumps(record) + '\n')
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunksize = max(1, len(files) // (jobs * 8))
+        for record in pool.map(solve_file, files, [max_nodes] * len(files), [timeout] * len(files),
+                                 [stats] * len(files), [preprocess] * len(files), [screen] * len(files),
+                                 [checkpoint_dir] * len(files), [checkpoint_interval] * len(files), chunksize=chunksize):
+            output.write(json.dumps(record) + '\n')
+
+def completed_batch_files(output_path):
+    """
+    Return the files already recorded in a --batch output file, dropping a last record that an
+    interrupted run left incomplete.
+    """
+    with open(output_path) as output:
+        lines = output.readlines()
+    done = []
+    for line in lines:
+        try:
+            done.append(json.loads(line)['file'])
+        except (ValueError, KeyError):
+            break
+    with open(output_path, 'w') as output:
+        output.writelines(lines[:len(done)])
+    return set(done)
+
+def build_parser():
+    parser = ArgumentParser()
+
+    parser.add_argument("-f", "--input_file",
+                        dest="input_file", default='data/example_01.txt',
+                        help="use this .csv file as input")
+
+    parser.add_argument("--batch",
+                        dest="batch", nargs='+', default=None,
+                        help="solve these matrix files and every matrix in these directories, glob patterns or manifest files (@file)")
+
+    parser.add_argument("-o", "--output",
+                        dest="output", default=None,
+                        help="write the --batch JSON lines to this file instead of stdout")
+
+    parser.add_argument("-v",
+                        action="store_true",
+                        help="verbose")
+
+    parser.add_argument("-j", "--jobs",
+                        dest="jobs", type=int, default=1,
+                        help="solve connected components (or --batch files) on this many worker processes")
+
+    parser.add_argument("--branch-jobs",
+                        dest="branch_jobs", type=int, default=1,
+                        help="explore the branches of the first universal case on this many worker processes")
+
+    parser.add_argument("--check",
+                        action="store_true",
+                        help=f"cross-check each component with an exhaustive search (up to {MAX_CHECK_CHARACTERS} characters)")
+
+    parser.add_argument("--max-nodes",
+                        dest="max_nodes", type=int, default=None,
+                        help="stop the search of a component after this many reduction steps (in this run, when resuming from a checkpoint)")
+
+    parser.add_argument("--timeout",
+                        dest="timeout", type=float, default=None,
+                        help="stop the search of a component after this many seconds")
+
+    parser.add_argument("--preprocess",
+                        action="store_true",
+                        help="merge duplicate species and characters and drop all-zero and all-one characters before solving")
+
+    parser.add_argument("--no-screen",
+                        dest="screen", action="store_false",
+                        help="do not screen components for forbidden submatrices before searching")
+
+    parser.add_argument("--checkpoint-dir",
+                        dest="checkpoint_dir", default=None,
+                        help="save the progress of each component search in this directory and resume from it")
+
+    parser.add_argument("--checkpoint-interval",
+                        dest="checkpoint_interval", type=float, default=CHECKPOINT_INTERVAL,
+                        help="seconds between two checkpoints of a component search")
+
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="with --batch and -o, skip the files already in the output file and append the others")
+
+    parser.add_argument("--stats",
+                        action="store_true",
+                        help="count and time the hot paths of the search and print them as JSON")
+
+    return parser
 
 ########
 # MAIN #
 ########
 
-# Create a new instance of the BlackRedGraph
-graph = rbg.RedBlackGraph()
-graph.read_from_file(data_file)
-if verbose:
-    graph.plot_graph()
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    verbose = args.v
+
+    if args.checkpoint_dir is not None:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
 
-# Connected components
-G = graph.get_graph()
-connected_components = [G.subgraph(c).copy() for c in nx.connected_components(G)]
-print('---')
-print(f'Numer of connected components: {len(connected_components)}')
+    if args.batch is not None:
+        files = batch_inputs(args.batch)
+        options = (args.jobs, args.max_nodes, args.timeout, args.stats, args.preprocess, args.screen,
+                   args.checkpoint_dir, args.checkpoint_interval)
+        if args.output is None:
+            solve_batch(files, sys.stdout, *options)
+        else:
+            mode = 'w'
+            if args.resume and os.path.exists(args.output):
+                done = completed_batch_files(args.output)
+                files = [file_path for file_path in files if file_path not in done]
+                mode = 'a'
+            with open(args.output, mode) as output:
+                solve_batch(files, output, *options)
+        return
 
-for i, cc_graph in enumerate(connected_components) :
+    # Create a new instance of the BlackRedGraph
+    graph = rbg.RedBlackGraph()
+    graph.read_from_file(args.input_file)
+    if verbose:
+        graph.plot_graph()
+    preprocessing = None
+    if args.preprocess:
+        preprocessing = Preprocessing(graph)
+        graph = preprocessing.graph
+        summary = preprocessing.summary()
+        print('---')
+        print(f" Preprocessing: {summary['species']} species and {summary['characters']} characters reduced to"
+              f" {summary['reduced_species']} species and {summary['reduced_characters']} characters")
+    if args.stats:
+        graph.enable_stats()
+
+    # Connected components
+    connected_components = graph.connected_components()
     print('---')
-    rb_cc_graph = rbg.RedBlackGraph()
-    rb_cc_graph.from_networkx_graph(cc_graph)
-    
-    n_red, n_black = rb_cc_graph.get_species() 
-    n_species = len(n_red) + len(n_black)
-    n_characters =  cc_graph.number_of_nodes()-n_species
-    print(f' Connected component {i}\n Number of characters: {n_characters}\n Number of species: {n_species}\n Number of edges: {cc_graph.number_of_edges()}')
-    #rb_cc_graph.print_status()
+    print(f'Numer of connected components: {len(connected_components)}')
+
+    for i, rb_cc_graph in enumerate(connected_components) :
+        print('---')
+        n_red, n_black = rb_cc_graph.get_species() 
+        n_species = len(n_red) + len(n_black)
+        n_characters = len(rb_cc_graph.get_characters())
+        print(f' Connected component {i}\n Number of characters: {n_characters}\n Number of species: {n_species}\n Number of edges: {rb_cc_graph.number_of_edges()}')
+        #rb_cc_graph.print_status()
     print('---')
 
-    reduction = reduction_recursive(rb_cc_graph)
-    is_correct = ('fail' not in reduction)
-    if is_correct :
-        print(f'SUCESS: {reduction}')
-    else :
-        print(f'NO DOLLO-1')
-#print()
+    if args.checkpoint_dir is not None:
+        results = [solve_checkpointed(rb_cc_graph, checkpoint_path(args.checkpoint_dir, args.input_file, i), args.max_nodes,
+                                      args.timeout, verbose, args.screen, args.checkpoint_interval)
+                   for i, rb_cc_graph in enumerate(connected_components)]
+    else:
+        results = solve_components(connected_components, args.jobs, args.max_nodes, args.timeout, verbose, args.branch_jobs,
+                                   args.screen)
+    for i, result in enumerate(results) :
+        if result.success :
+            reduction = result.reduction if preprocessing is None else preprocessing.expand_duplicates(result.reduction)
+            print(f'SUCESS: {reduction}')
+        elif result.status == 'fail' :
+            print(f'NO DOLLO-1')
+        else :
+            print(f'UNKNOWN: search stopped ({result.status}) after {result.nodes} steps')
+    merged = merge_results(results)
+    if merged.success :
+        if preprocessing is not None :
+            merged.reduction = preprocessing.expand(merged.reduction)
+        print(f'Reduction: {merged.reduction}')
+    if args.stats :
+        print(f'Stats: {json.dumps(merge_stats([graph.stats, merged.stats]), sort_keys=True)}')
+    #print()
 
-all_permutations(graph)
+    if args.check :
+        for i, rb_cc_graph in enumerate(graph.connected_components()) :
+            n_characters = len(rb_cc_graph.get_characters())
+            if n_characters > MAX_CHECK_CHARACTERS :
+                print(f'CHECK SKIPPED: component {i} has {n_characters} characters')
+                continue
+            order = exhaustive_reduction(rb_cc_graph)
+            if order is not None :
+                print(f'SUCESS: {order} exhaustive check')
+            else :
+                print(f'NO DOLLO-1 exhaustive check')
 
+if __name__ == '__main__':
+    main()
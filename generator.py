@@ -0,0 +1,131 @@
+import os
+import random
+from argparse import ArgumentParser
+
+# A species x character matrix without a Dollo-1 reduction (data/example_02.txt). Any matrix that
+# contains it as a submatrix has none either.
+NO_DOLLO_1_BLOCK = [
+    [0, 0, 0, 1, 0, 0, 0, 1],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 1, 1, 0, 0, 0, 0, 0],
+    [1, 1, 0, 0, 0, 0, 0, 0],
+    [1, 1, 1, 0, 1, 0, 1, 0],
+    [0, 1, 1, 1, 1, 0, 0, 0],
+    [1, 0, 0, 0, 1, 0, 0, 0],
+    [0, 0, 0, 0, 0, 1, 1, 1],
+]
+
+def random_tree(num_species, rng):
+    """
+    Grow a random rooted binary tree with num_species leaves by repeatedly splitting a random leaf.
+    Return the children lists (node 0 is the root) and the leaves.
+    """
+    children = [[]]
+    leaves = [0]
+    while len(leaves) < num_species:
+        leaf = leaves.pop(rng.randrange(len(leaves)))
+        for _ in range(2):
+            children[leaf].append(len(children))
+            leaves.append(len(children))
+            children.append([])
+    return children, leaves
+
+def subtree_leaves(children, leaves):
+    """
+    Return the set of leaves below every node of the tree.
+    """
+    below = [None] * len(children)
+    leaf_set = set(leaves)
+    # Children always have larger ids than their parent
+    for node in reversed(range(len(children))):
+        below[node] = {node} if node in leaf_set else set().union(*(below[child] for child in children[node]))
+    return below
+
+def subtree_nodes(children):
+    """
+    Return the list of nodes below every node of the tree, the node included.
+    """
+    nodes = [None] * len(children)
+    for node in reversed(range(len(children))):
+        nodes[node] = [node] + [descendant for child in children[node] for descendant in nodes[child]]
+    return nodes
+
+def yes_instance(num_species, num_characters, density=0.2, loss_probability=0.5, seed=None):
+    """
+    Generate a species x character matrix with a Dollo-1 (persistent) phylogeny: every character
+    is gained once on a random tree and, with loss_probability, lost once below its gain. Gain nodes
+    are picked so that each character is present in about density of the species.
+    """
+    rng = random.Random(seed)
+    children, leaves = random_tree(num_species, rng)
+    below = subtree_leaves(children, leaves)
+    descendants = subtree_nodes(children)
+    target = max(1, round(density * num_species))
+
+    columns = []
+    for _ in range(num_characters):
+        # Pick the gain node among a few samples whose subtree size is closest to the target
+        gain = min(rng.sample(range(len(children)), min(8, len(children))), key=lambda node: abs(len(below[node]) - target))
+        present = set(below[gain])
+        if rng.random() < loss_probability and len(descendants[gain]) > 1:
+            loss = rng.choice([node for node in descendants[gain] if node != gain])
+            present -= below[loss]
+        columns.append(present)
+
+    # Species are the leaves, in random order
+    rng.shuffle(leaves)
+    return [[int(leaf in column) for column in columns] for leaf in leaves]
+
+def no_instance(num_species, num_characters, density=0.2, loss_probability=0.5, seed=None):
+    """
+    Generate a species x character matrix without a Dollo-1 phylogeny: a yes-instance whose last
+    characters hold NO_DOLLO_1_BLOCK over random species.
+    """
+    block_size = len(NO_DOLLO_1_BLOCK)
+    if num_species < block_size or num_characters < block_size:
+        raise ValueError(f"No-instances need at least {block_size} species and {block_size} characters")
+    rng = random.Random(seed)
+    matrix = yes_instance(num_species, num_characters - block_size, density, loss_probability, rng.random())
+    block_species = rng.sample(range(num_species), block_size)
+    for i, row in enumerate(matrix):
+        row.extend(NO_DOLLO_1_BLOCK[block_species.index(i)] if i in block_species else [0] * block_size)
+    return matrix
+
+def write_matrix(matrix, file_path):
+    """
+    Write a matrix in the text format read by RedBlackGraph.read_from_file.
+    """
+    num_characters = len(matrix[0]) if matrix else 0
+    with open(file_path, 'w') as file:
+        file.write(f'{len(matrix)} {num_characters}\n\n')
+        for row in matrix:
+            file.write(' '.join(map(str, row)) + '\n')
+
+def instance_name(kind, num_species, num_characters, density, seed):
+    prefix = 'ok' if kind == 'yes' else 'no'
+    return f'{prefix}_{num_species}_{num_characters}_{density}_{seed}_M.txt'
+
+def main(argv=None):
+    parser = ArgumentParser(description="Generate Dollo-1 yes-instances (random trees with one-loss characters) and no-instances")
+    parser.add_argument("--kind", choices=['yes', 'no'], default='yes')
+    parser.add_argument("--species", type=int, default=10)
+    parser.add_argument("--characters", type=int, default=10)
+    parser.add_argument("--density", type=float, default=0.2,
+                        help="approximate fraction of species that have each character")
+    parser.add_argument("--loss-probability", dest="loss_probability", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--count", type=int, default=1,
+                        help="number of instances, with seeds seed, seed + 1, ...")
+    parser.add_argument("-o", "--output-dir", dest="output_dir", default='.')
+    args = parser.parse_args(argv)
+
+    generate = yes_instance if args.kind == 'yes' else no_instance
+    os.makedirs(args.output_dir, exist_ok=True)
+    for seed in range(args.seed, args.seed + args.count):
+        matrix = generate(args.species, args.characters, args.density, args.loss_probability, seed)
+        file_path = os.path.join(args.output_dir, instance_name(args.kind, args.species, args.characters, args.density, seed))
+        write_matrix(matrix, file_path)
+        print(file_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import networkx as nx
+import matplotlib.pyplot as plt
+
+def plot_graph(rb_graph):
+    graph = rb_graph.get_graph()
+    char_nodes = [n for n,v in graph.nodes(data=True) if v['bipartite'] == 0] 
+    species_nodes = [n for n,v in graph.nodes(data=True) if v['bipartite'] == 1]
+    
+    pos = nx.bipartite_layout(graph, char_nodes, scale=3, align='horizontal')
+    nx.draw_networkx_nodes(graph, pos, nodelist=char_nodes, node_color='b', node_size=1500,alpha=0.2)
+    nx.draw_networkx_nodes(graph, pos, nodelist=species_nodes, node_color='gray', node_size=1500,alpha=0.2)
+    
+    black_edges = [(u,v) for u,v,e in graph.edges(data=True) if e['color'] == 'black']
+    red_edges =   [(u,v) for u,v,e in graph.edges(data=True) if e['color'] == 'red']
+    nx.draw_networkx_edges(graph, pos, edgelist=black_edges, edge_color='k')
+    nx.draw_networkx_edges(graph, pos, edgelist=red_edges, edge_color='r')
+    
+    char_labels = {node: node for node in char_nodes}
+    species_labels = {node: node for node in species_nodes}
+    labels = {**char_labels, **species_labels}
+    
+    nx.draw_networkx_labels(graph, pos, labels, font_size=10, font_color='k')
+    
+    plt.axis('off')
+    plt.show()
@@ -0,0 +1,119 @@
+import RedBlackGraph as rbg
+
+class Preprocessing:
+    """
+    Shrink a freshly read graph before solving. Identical species rows and identical character
+    columns are merged into their first node, which keeps a weight (its number of copies), and
+    characters that no species has (all-zero columns) or that every species has (all-one columns)
+    are dropped. graph is the reduced RedBlackGraph, with the original node names; expand turns
+    a reduction of it into one of the original graph.
+    """
+    def __init__(self, rb_graph):
+        character_names, character_rows, species_names, species_rows = rb_graph.get_rows()
+
+        # Merge identical species rows
+        species_groups = {}
+        for i, row in enumerate(species_rows):
+            species_groups.setdefault(row, []).append(i)
+        kept_species = sorted(ids[0] for ids in species_groups.values())
+        self.species_weights = {species_names[ids[0]]: len(ids) for ids in species_groups.values()}
+
+        # Character columns over the kept species
+        columns = [0] * len(character_names)
+        for k, i in enumerate(kept_species):
+            for j in rbg.iter_bits(species_rows[i]):
+                columns[j] |= 1 << k
+        all_species = (1 << len(kept_species)) - 1
+
+        # Drop constant columns and merge identical ones
+        self.zero_characters = []
+        self.universal_characters = []
+        character_groups = {}
+        for j, column in enumerate(columns):
+            if column == 0:
+                self.zero_characters.append(character_names[j])
+            elif column == all_species:
+                self.universal_characters.append(character_names[j])
+            else:
+                character_groups.setdefault(column, []).append(j)
+        kept_characters = sorted(ids[0] for ids in character_groups.values())
+        self.character_weights = {character_names[ids[0]]: len(ids) for ids in character_groups.values()}
+        # Characters realized right after their representative
+        self.duplicates = {character_names[ids[0]]: [character_names[j] for j in ids[1:]]
+                           for ids in character_groups.values() if len(ids) > 1}
+
+        new_character_rows = [columns[j] for j in kept_characters]
+        new_species_rows = [0] * len(kept_species)
+        for j, column in enumerate(new_character_rows):
+            for k in rbg.iter_bits(column):
+                new_species_rows[k] |= 1 << j
+        self.graph = rbg.RedBlackGraph()
+        self.graph.from_rows(new_character_rows, new_species_rows,
+                             [character_names[j] for j in kept_characters], [species_names[i] for i in kept_species])
+
+    def expand_duplicates(self, reduction):
+        """
+        Insert the merged duplicates of each character right after it.
+        """
+        expanded = []
+        for character in reduction:
+            expanded.append(character)
+            expanded.extend(self.duplicates.get(character, []))
+        return expanded
+
+    def expand(self, reduction):
+        """
+        Expand a reduction of graph into one of the original graph: all-one characters are realized
+        first, duplicates follow their representative and all-zero characters come last.
+        """
+        return self.universal_characters + self.expand_duplicates(reduction) + self.zero_characters
+
+    def summary(self):
+        """
+        Return the sizes before and after preprocessing, as a dict.
+        """
+        num_characters = sum(self.character_weights.values()) + len(self.zero_characters) + len(self.universal_characters)
+        return {'species': sum(self.species_weights.values()), 'characters': num_characters,
+                'reduced_species': len(self.species_weights), 'reduced_characters': len(self.character_weights),
+                'zero_characters': len(self.zero_characters), 'universal_characters': len(self.universal_characters)}
+
+# Most character triples find_forbidden_triple tests before giving up
+MAX_SCREEN_TRIPLES = 200000
+
+def find_forbidden_triple(rb_graph, max_triples=MAX_SCREEN_TRIPLES):
+    """
+    Screen an unreduced graph for three characters a, b, c such that the species show every
+    pattern with one or two of them (100, 010, 001, 110, 101, 011). That 6 x 3 submatrix has no
+    Dollo-1 phylogeny, and neither has any matrix containing it. Return the three characters, or
+    None if there are none or max_triples were tested without finding one.
+    """
+    character_names, character_rows, _, species_rows = rb_graph.get_rows()
+    # Overlapping pairs share a species and neither contains the other. The three pairs of a
+    # forbidden triple overlap, so only triangles of the overlap graph are tested.
+    overlaps = [0] * len(character_rows)
+    for a, row_a in enumerate(character_rows):
+        sharing = 0
+        for s in rbg.iter_bits(row_a):
+            sharing |= species_rows[s]
+        for b in rbg.iter_bits(sharing >> (a + 1)):
+            b += a + 1
+            row_b = character_rows[b]
+            if row_a & ~row_b and row_b & ~row_a:
+                overlaps[a] |= 1 << b
+                overlaps[b] |= 1 << a
+
+    triples = 0
+    for a, row_a in enumerate(character_rows):
+        later_a = overlaps[a] >> (a + 1) << (a + 1)
+        for b in rbg.iter_bits(later_a):
+            row_b = character_rows[b]
+            only_a, only_b, both = row_a & ~row_b, row_b & ~row_a, row_a & row_b
+            for c in rbg.iter_bits(later_a & overlaps[b] >> (b + 1) << (b + 1)):
+                row_c = character_rows[c]
+                if (only_a & ~row_c and only_b & ~row_c and row_c & ~row_a & ~row_b
+                        and both & ~row_c and only_a & row_c and only_b & row_c):
+                    return character_names[a], character_names[b], character_names[c]
+                triples += 1
+                if triples >= max_triples:
+                    return None
+    return None